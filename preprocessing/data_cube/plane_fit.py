@@ -0,0 +1,82 @@
+import functools
+import numpy as np
+
+class PlaneFitter:
+    """
+    A class to fit and remove a 2D plane, a + b*row + c*column, from images by least squares.
+
+    On a full pixel grid, the centered row and column coordinates are orthogonal to each other and to the
+    constant term, so the least squares solution has a closed form: the offset is the mean of the image and
+    each slope is a weighted sum of the image along one axis. The weights only depend on the image size and
+    are cached for each shape, so fitting a plane takes two reductions instead of building and inverting an
+    (height*width)x3 design matrix. Images of any shape are supported, and a whole stack of images is fitted
+    in a single call.
+    """
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def weights(height, width):
+        """
+        Compute the centered coordinates of each axis and the weights giving the slope along each axis.
+
+        Parameters:
+            height (int): Number of rows of the images.
+            width (int): Number of columns of the images.
+
+        Returns:
+            tuple: Centered row coordinates, centered column coordinates, row weights and column weights.
+        """
+        rows    = np.arange(height) - (height - 1) / 2.0
+        columns = np.arange(width) - (width - 1) / 2.0
+
+        # An axis of length 1 has no slope, as in the minimum norm solution of the full least squares problem
+        row_norm    = width * np.sum(rows ** 2)
+        column_norm = height * np.sum(columns ** 2)
+        row_weights    = rows / row_norm if row_norm > 0 else np.zeros(height)
+        column_weights = columns / column_norm if column_norm > 0 else np.zeros(width)
+
+        for array in (rows, columns, row_weights, column_weights):
+            array.flags.writeable = False
+        return rows, columns, row_weights, column_weights
+
+    @staticmethod
+    def fit_plane(images, axes=(-2, -1)):
+        """
+        Fit a plane to each image of a stack.
+
+        Parameters:
+            images (np.array): Image, or stack of images.
+            axes (tuple, optional): Row and column axes of the images. Defaults to the last two axes.
+
+        Returns:
+            np.array: The fitted planes, with the same shape as the images.
+        """
+        images = np.moveaxis(np.asarray(images), axes, (-2, -1))
+        rows, columns, row_weights, column_weights = PlaneFitter.weights(*images.shape[-2:])
+
+        offset       = images.mean(axis=(-2, -1), dtype=np.float64)
+        row_slope    = images.sum(axis=-1, dtype=np.float64) @ row_weights
+        column_slope = images.sum(axis=-2, dtype=np.float64) @ column_weights
+
+        plane = (
+            offset[..., np.newaxis, np.newaxis]
+            + row_slope[..., np.newaxis, np.newaxis] * rows[:, np.newaxis]
+            + column_slope[..., np.newaxis, np.newaxis] * columns
+        )
+        return np.moveaxis(plane, (-2, -1), axes)
+
+    @staticmethod
+    def remove_plane(images, axes=(-2, -1)):
+        """
+        Subtract the fitted plane from each image of a stack.
+
+        Parameters:
+            images (np.array): Image, or stack of images.
+            axes (tuple, optional): Row and column axes of the images. Defaults to the last two axes.
+
+        Returns:
+            np.array: The images after removing the plane, in the floating point precision of the images.
+        """
+        images = np.asarray(images)
+        dtype  = np.result_type(images.dtype, np.float32)
+        return (images - PlaneFitter.fit_plane(images, axes)).astype(dtype, copy=False)
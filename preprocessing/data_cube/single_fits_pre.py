@@ -1,7 +1,10 @@
 import os
 import math
+import time
 import numpy as np
 from astropy.io import fits
+from plane_fit import PlaneFitter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 class PreProcessFITSSingle:
     """
@@ -52,20 +55,13 @@ class PreProcessFITSSingle:
         Remove a 2D plane from the array.
 
         Parameters:
-            array (np.array): Input 2D array.
+            array (np.array): Input 2D array, or 3D array whose channels are in the last axis.
+                              A plane is removed from each channel.
 
         Returns:
             np.array: Array after removing the 2D plane.
         """
-        m       = array.shape[0]  # Assume it is square!
-        X1, X2  = np.mgrid[:m, :m]
-        X       = np.hstack((np.reshape(X1, (m * m, 1)), np.reshape(X2, (m * m, 1))))
-        X       = np.hstack((np.ones((m * m, 1)), X))
-        YY      = np.reshape(array, (m * m, 1))
-        theta   = np.dot(np.dot(np.linalg.pinv(np.dot(X.transpose(), X)), X.transpose()), YY)
-        plane   = np.reshape(np.dot(X, theta), (m, m))
-        sub     = array - plane
-        return sub
+        return PlaneFitter.remove_plane(array, axes=(0, 1))
 
     def read_fits(self, file_path):
         """
@@ -145,45 +141,120 @@ class PreProcessFITSSingle:
         """
         return data[: target_shape[0], : target_shape[1], :]
 
-    def process_directory(self):
+    def process_file(self, file_name):
         """
-        Process FITS files in the input directory and save them in the output directory.
+        Process a FITS file of the input directory and save it in the output directory.
+
+        Parameters:
+            file_name (str): Name of the FITS file in the input directory.
         """
-        for file_name in os.listdir(self.input_dir):
-            if file_name.endswith(".fits"):
-                file_path = os.path.join(self.input_dir, file_name)
+        file_path = os.path.join(self.input_dir, file_name)
 
-                # Read the FITS file
-                with fits.open(file_path) as hdul:
-                    data   = hdul[1].data
-                    header = hdul[1].header
+        # Read the FITS file
+        with fits.open(file_path) as hdul:
+            data   = hdul[1].data
+            header = hdul[1].header
 
-                # Duplicate the data
-                duplicated_data = self.duplicate_data(data)
+        # Duplicate the data
+        duplicated_data = self.duplicate_data(data)
 
-                # Normalize the data
-                normalized_data = self.normalize_data(duplicated_data, header)
+        # Normalize the data
+        normalized_data = self.normalize_data(duplicated_data, header)
 
-                # Ensure data is within range [-1, 1]
-                normalized_data = np.clip(normalized_data, -1, 1)
+        # Ensure data is within range [-1, 1]
+        normalized_data = np.clip(normalized_data, -1, 1)
 
-                # Resize the data
-                resized_data = self.resize_data(normalized_data)
+        # Resize the data
+        resized_data = self.resize_data(normalized_data)
 
-                # Save the processed data
-                output_path = os.path.join(self.output_dir, file_name)
-                hdu = fits.PrimaryHDU(data=resized_data)
-                hdu.writeto(output_path, overwrite=True)
+        # Save the processed data
+        output_path = os.path.join(self.output_dir, file_name)
+        hdu = fits.PrimaryHDU(data=resized_data)
+        hdu.writeto(output_path, overwrite=True)
 
-    def run(self):
+    def process_chunk(self, file_names):
+        """
+        Process a chunk of FITS files. A file that fails is skipped, so it does not abort the rest of the chunk.
+
+        Parameters:
+            file_names (list): Names of the FITS files in the input directory.
+
+        Returns:
+            list: Tuples of the file name and the error message of each file that failed.
+        """
+        errors = []
+        for file_name in file_names:
+            try:
+                self.process_file(file_name)
+            except Exception as e:
+                errors.append((file_name, f"{type(e).__name__}: {e}"))
+        return errors
+
+    def process_directory(self, num_workers=1, chunk_size=16, max_chunks_in_flight=None):
+        """
+        Process FITS files in the input directory and save them in the output directory.
+
+        With more than one worker, the files are split into chunks processed by a pool of processes. At most
+        max_chunks_in_flight chunks are submitted at a time, which bounds the memory used by pending work.
+        Files that fail are logged and skipped, and the progress is reported after every chunk.
+
+        Parameters:
+            num_workers (int, optional): Number of worker processes. Defaults to 1, which processes the files in this process.
+            chunk_size (int, optional): Number of files per chunk. Defaults to 16.
+            max_chunks_in_flight (int, optional): Maximum number of chunks submitted and not completed. Defaults to twice the number of workers.
+
+        Returns:
+            list: Tuples of the file name and the error message of each file that failed.
+        """
+        file_names = sorted(file_name for file_name in os.listdir(self.input_dir) if file_name.endswith(".fits"))
+        chunks     = [file_names[idx:idx + chunk_size] for idx in range(0, len(file_names), chunk_size)]
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        errors     = []
+        processed  = 0
+        start_time = time.time()
+
+        def report(chunk, chunk_errors):
+            nonlocal processed
+            processed += len(chunk)
+            for file_name, error in chunk_errors:
+                print(f"Skipped {file_name}: {error}")
+            errors.extend(chunk_errors)
+            elapsed = time.time() - start_time
+            print(f"Processed {processed}/{len(file_names)} files ({processed / elapsed:.1f} files/sec), {len(errors)} failed")
+
+        if num_workers <= 1:
+            for chunk in chunks:
+                report(chunk, self.process_chunk(chunk))
+        else:
+            max_chunks_in_flight = max_chunks_in_flight or 2 * num_workers
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                pending = {}
+                for chunk in chunks:
+                    if len(pending) >= max_chunks_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            report(pending.pop(future), future.result())
+                    pending[executor.submit(self.process_chunk, chunk)] = chunk
+                for future in wait(pending).done:
+                    report(pending.pop(future), future.result())
+
+        print(f"Done: {processed - len(errors)} files processed and {len(errors)} skipped in {time.time() - start_time:.1f} sec.")
+        return errors
+
+    def run(self, num_workers=1):
         """
         Main method to run the preprocessing steps.
+
+        Parameters:
+            num_workers (int, optional): Number of worker processes. Defaults to 1.
         """
-        self.process_directory()
+        self.process_directory(num_workers)
 
 if __name__ == "__main__":
     input_dir   = input("Enter the input directory path: ")
     output_dir  = input("Enter the output directory path: ")
     data_type   = int(input("Enter the type of FITS file (1 for magnetogram, 2 for intensity, 3 for divergence): "))
+    num_workers = int(input(f"Enter the number of worker processes (1 to {os.cpu_count()}, default 1): ") or 1)
     processor   = PreProcessFITSSingle(input_dir, output_dir, data_type)
-    processor.run()
+    processor.run(num_workers)
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import shutil
+import numpy as np
+from three_fits_pre import PreProcessFITSThree, create_argument_parser, apply_arguments
+
+# The store is read by the training application, so it is written with its classes. Only data.shard_store is
+# imported, which depends on numpy alone, so TensorFlow is never loaded before the worker processes are forked
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+from data.shard_store import ShardStore, ShardStoreWriter
+
+class DatasetStoreBuilder(PreProcessFITSThree):
+    """
+    A class to build a training-ready dataset straight from the raw magnetogram, intensity and divergence maps.
+
+    The data cubes are built as by PreProcessFITSThree, but instead of being written as FITS files they are streamed
+    into a sharded store of native float32 images (see data.shard_store), which the "memmap" pipeline of the training
+    application reads without decoding. The cubes of consecutive time intervals of each active region are paired, the
+    pairs are split into training and testing sets, and each set is described by a pairs.csv file in a train/ or test/
+    subdirectory of the store. The raw maps are read once and each cube is written once, replacing the FITS cubes,
+    pairs.csv, train/test copies and compiled dataset of the file-based workflow.
+    """
+
+    SPLITS = ("train", "test")
+
+    def process_cube(self, ar, ti, mfilename, vfilename, ifilename):
+        """
+        Build the data cube of an active region and time interval, without saving it.
+
+        Parameters:
+            ar (int): Active region.
+            ti (int): Time interval.
+            mfilename, vfilename, ifilename (str): Paths to the magnetogram, divergence and intensity FITS files.
+
+        Returns:
+            tuple: Clip statistics and thumbnail of the cube (see build_cube), and the cube as native float32 data.
+        """
+        cube, stats, thumbnail = self.build_cube(ar, ti, mfilename, vfilename, ifilename)
+        return stats, thumbnail, cube.astype("<f4")
+
+    @staticmethod
+    def pair_cubes(stats):
+        """
+        Pair the cubes of consecutive time intervals of each active region, as PairFiles does for files.
+
+        Parameters:
+            stats (list): Clip statistics of each cube built, with its name, active region and time interval.
+
+        Returns:
+            list: (input cube, target cube) names, sorted by active region and time interval.
+        """
+        cubes = {(cube_stats["ar"], cube_stats["ti"]): cube_stats["cube"] for cube_stats in stats}
+        return [(cubes[(ar, ti)], cubes[(ar, ti + 1)]) for ar, ti in sorted(cubes) if (ar, ti + 1) in cubes]
+
+    def split_pairs(self, pairs):
+        """
+        Shuffle the pairs with SPLIT_SEED and split them into training and testing sets, as DataSplitter does.
+
+        Parameters:
+            pairs (list): (input cube, target cube) names.
+
+        Returns:
+            dict: The pairs of each split.
+        """
+        order      = np.random.default_rng(self.config["SPLIT_SEED"]).permutation(len(pairs))
+        train_size = int(self.config["TRAIN_RATIO"] * len(pairs))
+        return {
+            "train": [pairs[idx] for idx in order[:train_size]],
+            "test":  [pairs[idx] for idx in order[train_size:]],
+        }
+
+    def write_split(self, build_dir, split, pairs):
+        """
+        Write the pairs.csv file of a split, and the pointer to the store read by the DataLoader.
+
+        Parameters:
+            build_dir (str): Directory in which the store is being built.
+            split (str): Name of the split.
+            pairs (list): (input cube, target cube) names of the split.
+        """
+        split_dir = os.path.join(build_dir, split)
+        os.makedirs(split_dir)
+        with open(os.path.join(split_dir, "pairs.csv"), "w") as file:
+            file.write("input,target\n")
+            for input_cube, target_cube in pairs:
+                file.write(f"{input_cube},{target_cube}\n")
+        with open(os.path.join(split_dir, ShardStore.STORE_POINTER_NAME), "w") as file:
+            json.dump({"store": os.path.abspath(self.config["STORE_DIR"])}, file, indent=2)
+
+    def run(self, max_chunks_in_flight=None):
+        """
+        Main method to build the dataset store of every (AR, TI) of the index, in parallel if NUM_WORKERS is more than 1
+        (see process_index). The cubes are added to the store as the workers return them, so only the current shard is
+        held in memory. The store is built in a temporary directory and moved to STORE_DIR once complete, so an
+        interrupted build is never used for training.
+
+        Parameters:
+            max_chunks_in_flight (int, optional): Maximum number of chunks submitted and not completed. Defaults to twice the number of workers.
+
+        Returns:
+            list: Tuples of the cube name and the error message of each entry that failed.
+        """
+        start_time = time.time()
+        index      = self.build_index()
+        print(f"Found {len(index)} (AR, TI) with all three files in {time.time() - start_time:.1f} sec.")
+
+        store_dir = self.config["STORE_DIR"]
+        build_dir = store_dir + ".tmp"
+        if os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+        os.makedirs(build_dir)
+
+        writer     = ShardStoreWriter(build_dir, self.config["IMAGES_PER_SHARD"])
+        stats      = []
+        thumbnails = []
+
+        def collect(result):
+            cube_stats, thumbnail, cube = result
+            writer.add(cube_stats["cube"], cube)
+            stats.append(cube_stats)
+            self.keep_thumbnail(thumbnails, cube_stats, thumbnail)
+
+        errors = self.process_index(index, collect, max_chunks_in_flight)
+        pairs  = self.pair_cubes(stats)
+        splits = self.split_pairs(pairs)
+        for split in self.SPLITS:
+            self.write_split(build_dir, split, splits[split])
+
+        manifest = {
+            "version": ShardStore.VERSION,
+            "format":  "npy",
+            "splits":  {split: len(split_pairs) for split, split_pairs in splits.items()},
+            # All the pairs, so rollouts from the inputs of a split can follow the sequences through the other split
+            "pairs":   [list(pair) for pair in pairs],
+            "config":  self.config,
+            **writer.close(),
+        }
+        with open(os.path.join(build_dir, ShardStore.MANIFEST_NAME), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+        if os.path.exists(store_dir):
+            shutil.rmtree(store_dir)
+        os.replace(build_dir, store_dir)
+        self.report_clipping(stats, thumbnails, store_dir)
+
+        print(f"Done: {len(stats)} cubes written to {len(manifest['shards'])} shards in {store_dir}, with "
+              f"{manifest['splits']['train']} training and {manifest['splits']['test']} testing pairs. "
+              f"{len(errors)} cubes skipped in {time.time() - start_time:.1f} sec.")
+        return errors
+
+if __name__ == "__main__":
+    parser = create_argument_parser("Build a training-ready dataset store of 3-channel data cubes straight from the raw maps.")
+    parser.add_argument("--store-dir", help="Directory of the dataset store.")
+    parser.add_argument("--train-ratio", type=float, help="Fraction of the pairs used for training.")
+    arguments = parser.parse_args()
+    config    = apply_arguments(
+        PreProcessFITSThree.load_config(arguments.config),
+        arguments,
+        {"STORE_DIR": arguments.store_dir, "TRAIN_RATIO": arguments.train_ratio},
+    )
+    DatasetStoreBuilder(config).run()
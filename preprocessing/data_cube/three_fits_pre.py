@@ -1,230 +1,543 @@
-""" 
+"""
 Dr Hannah Schunker
 
-18/08/2023 
+18/08/2023
 """
 
+import os
+import re
+import math
+import time
+import yaml
+import heapq
+import argparse
 import numpy as np
-import array
+import pandas as pd
 from astropy.io import ascii
 from astropy.io import fits
-import matplotlib.pyplot as plt
-from matplotlib import colors
-import os.path
-import glob, os
-import math
+from plane_fit import PlaneFitter
+from matplotlib.figure import Figure
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+class PreProcessFITSThree:
+    """
+    A class to build 3-channel data cubes from three different FITS files.
+    For each active region (AR) and time interval (TI), the magnetogram, divergence and intensity maps are normalized,
+    cropped and stacked into a (CROP_SIZE, CROP_SIZE, 3) cube, which is saved as channels_AR<ar>_TI<ti>.fits in the
+    output directory. The input directories are scanned once into an (AR, TI) index of the available files.
+    Values outside [-1, 1] are clipped, and the fraction of clipped pixels and the value range of each channel are
+    recorded in a summary table of the run.
+    """
+
+    CONFIG_PATH = "config/data_cube.yaml"
+    CHANNELS    = ("magnetogram", "divergence", "intensity")
+
+    def __init__(self, config):
+        """
+        Initializes the PreProcessFITSThree class with the data cube configuration.
+
+        Parameters:
+            config (dict): Configuration, with the keys of the data_cube section of config/data_cube.yaml.
+        """
+        self.config = config
+
+    @staticmethod
+    def load_config(config_path):
+        """
+        Load the data cube configuration.
+
+        Parameters:
+            config_path (str): Path to the configuration file.
+
+        Returns:
+            dict: The data_cube section of the configuration file.
+        """
+        with open(config_path, "r") as file:
+            return yaml.safe_load(file)["data_cube"]
+
+    @staticmethod
+    def extract_ar_and_ti(file_name):
+        """
+        Extract the active region and time interval from a file name.
+
+        Parameters:
+            file_name (str): Name of the file.
+
+        Returns:
+            tuple: Active region and time interval, or (None, None) if the name does not contain both.
+        """
+        ar_match = re.search(r"AR(\d+)", file_name)
+        ti_match = re.search(r"TI([+-]?\d+)", file_name)
+
+        if ar_match and ti_match:
+            return int(ar_match.group(1)), int(ti_match.group(1))
+        return None, None
+
+    def scan_directory(self, directory, prefix):
+        """
+        Index the FITS files of a directory by active region and time interval.
+
+        Parameters:
+            directory (str): Directory to scan.
+            prefix (str): Prefix of the file names to index.
+
+        Returns:
+            dict: Path of the file of each (AR, TI).
+        """
+        index = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.startswith(prefix) and entry.name.endswith(".fits"):
+                ar, ti = self.extract_ar_and_ti(entry.name)
+                if ar is not None:
+                    index[(ar, ti)] = entry.path
+        return index
+
+    def scan_divergence_directory(self, directory):
+        """
+        Index the divergence maps, stored in one HOLOG_AR<ar> subdirectory per active region, by active region and time interval.
+        If several maps exist for the same (AR, TI), the first in alphabetical order is used.
+
+        Parameters:
+            directory (str): Directory of the HOLOG_AR<ar> subdirectories.
+
+        Returns:
+            dict: Path of the divergence map of each (AR, TI).
+        """
+        index = {}
+        for ar_entry in os.scandir(directory):
+            ar_match = re.fullmatch(r"HOLOG_AR(\d+)", ar_entry.name)
+            if not (ar_entry.is_dir() and ar_match):
+                continue
+            for entry in sorted(os.scandir(ar_entry.path), key=lambda entry: entry.name):
+                ti_match = re.search(r"TI([+-]\d+)$", entry.name)
+                if entry.is_file() and entry.name.startswith("DT_OI_TD3_") and ti_match:
+                    index.setdefault((int(ar_match.group(1)), int(ti_match.group(1))), entry.path)
+        return index
+
+    def read_active_regions(self):
+        """
+        Read the active regions to process from the AR_LISTS files, whose first column holds the active region numbers.
+
+        Returns:
+            set: Active region numbers, or None to process every active region found in the input directories.
+        """
+        if not self.config["AR_LISTS"]:
+            return None
+        return {int(ar) for ar_list in self.config["AR_LISTS"] for ar in ascii.read(ar_list)["col1"]}
+
+    def build_index(self):
+        """
+        Scan the magnetogram, intensity and divergence directories once, and list the (AR, TI) with all three files.
+
+        Returns:
+            list: Sorted (AR, TI, magnetogram path, divergence path, intensity path) tuples.
+        """
+        magnetograms = self.scan_directory(self.config["MAGNETOGRAM_DIR"], "mps_schunker.avem_ears_")
+        intensities  = self.scan_directory(self.config["INTENSITY_DIR"], "mps_schunker.aveic_ears_")
+        divergences  = self.scan_divergence_directory(self.config["DIVERGENCE_DIR"])
+        active_regions = self.read_active_regions()
+
+        keys = magnetograms.keys() & intensities.keys() & divergences.keys()
+        return sorted(
+            (ar, ti, magnetograms[(ar, ti)], divergences[(ar, ti)], intensities[(ar, ti)])
+            for ar, ti in keys
+            if self.config["TI_MIN"] <= ti <= self.config["TI_MAX"] and (active_regions is None or ar in active_regions)
+        )
+
+    @staticmethod
+    def distance_to_disk_centre(crlt_obs, crln_obs, crlt_ref, crln_ref):
+        """
+        Calculate the distance to the disk center.
+
+        Parameters:
+            crlt_obs, crln_obs (float): Observer's latitude and longitude in degrees.
+            crlt_ref, crln_ref (float): Reference latitude and longitude in degrees.
+
+        Returns:
+            float: Distance to the disk center in radians.
+        """
+        # Convert to radians
+        crln_ref, crlt_ref, crln_obs, crlt_obs = [
+            angle * np.pi / 180.0 for angle in [crln_ref, crlt_ref, crln_obs, crlt_obs]
+        ]
+
+        dlon = abs(crln_obs - crln_ref)
+
+        distance = math.acos(
+            math.sin(crlt_obs) * math.sin(crlt_ref)
+            + math.cos(crlt_obs) * math.cos(crlt_ref) * math.cos(dlon)
+        )
+        return distance
+
+    @staticmethod
+    def read_fits(file_path, extension):
+        """
+        Read the data and header of a FITS file extension. The file is closed before returning.
+
+        Parameters:
+            file_path (str): Path to the FITS file.
+            extension (int): Index of the HDU to read.
+
+        Returns:
+            tuple: Data as a floating point array, in the precision of the file (at least float32), and header.
+        """
+        with fits.open(file_path) as hdul:
+            data = hdul[extension].data
+            if data is None:
+                print(50*"-")
+                print(f"Error: No data in FITS file: {file_path}")
+                raise ValueError
+            return np.array(data, dtype=np.result_type(data.dtype, np.float32)), hdul[extension].header
+
+    def crop(self, data):
+        """
+        Crop the central CROP_SIZE x CROP_SIZE pixels of a map.
+
+        Parameters:
+            data (np.array): Input map.
+
+        Returns:
+            np.array: Cropped map.
+        """
+        size        = self.config["CROP_SIZE"]
+        row, column = (data.shape[0] - size) // 2, (data.shape[1] - size) // 2
+        return data[row:row + size, column:column + size]
+
+    def clip(self, cube):
+        """
+        Clip the normalized data cube to [-1, 1], the range expected by pix2pix, and measure how much of each channel is clipped.
+
+        Parameters:
+            cube (np.array): Normalized (height, width, 3) data cube, clipped in place.
+
+        Returns:
+            dict: Minimum, maximum, and fractions of pixels below -1 and above 1 of each channel before clipping.
+        """
+        minimum = cube.min(axis=(0, 1))
+        maximum = cube.max(axis=(0, 1))
+        below   = np.count_nonzero(cube < -1, axis=(0, 1)) / (cube.shape[0] * cube.shape[1])
+        above   = np.count_nonzero(cube > 1, axis=(0, 1)) / (cube.shape[0] * cube.shape[1])
+        np.clip(cube, -1, 1, out=cube)
+
+        stats = {}
+        for idx, channel in enumerate(self.CHANNELS):
+            stats[f"{channel}_min"]   = float(minimum[idx])
+            stats[f"{channel}_max"]   = float(maximum[idx])
+            stats[f"{channel}_below"] = float(below[idx])
+            stats[f"{channel}_above"] = float(above[idx])
+        return stats
+
+    def build_cube(self, ar, ti, mfilename, vfilename, ifilename):
+        """
+        Build the normalized and clipped data cube of an active region and time interval.
+
+        Parameters:
+            ar (int): Active region.
+            ti (int): Time interval.
+            mfilename, vfilename, ifilename (str): Paths to the magnetogram, divergence and intensity FITS files.
+
+        Returns:
+            tuple: The (CROP_SIZE, CROP_SIZE, 3) cube, its clip statistics (see clip), and a thumbnail of the cube before
+                   clipping if CONTACT_SHEET is enabled and some values were clipped, None otherwise.
+        """
+        mdata, mhdr = self.read_fits(mfilename, 1)
+        vdata, _    = self.read_fits(vfilename, 0)
+        idata, _    = self.read_fits(ifilename, 1)
+
+        # Divide the magnetogram by cos theta
+        theta = self.distance_to_disk_centre(mhdr["CRLT_OBS"], mhdr["CRLN_OBS"], mhdr["CRLT_REF"], mhdr["CRLN_REF"])
+        if theta * 180 / np.pi > self.config["MAX_DISK_DISTANCE"]:
+            print(50*"-")
+            print(f"Error: Distance to disk centre is {theta * 180 / np.pi:.1f} degrees, more than {self.config['MAX_DISK_DISTANCE']} degrees.")
+            raise ValueError
+        mdata = mdata / math.cos(theta)
+
+        # Crop all maps, and remove the background plane from the intensity
+        mdata = self.crop(mdata)
+        vdata = self.crop(vdata)
+        isub  = PlaneFitter.remove_plane(self.crop(idata))
+
+        # Normalize, create the 3D data cube and clip it
+        cube = np.dstack((
+            mdata / self.config["MAGNETOGRAM_FACTOR"],
+            vdata / self.config["DIVERGENCE_FACTOR"],
+            isub / self.config["INTENSITY_FACTOR"],
+        ))
+        step      = max(1, cube.shape[0] // self.config["THUMBNAIL_SIZE"])
+        thumbnail = cube[::step, ::step].astype(np.float32)
+        stats     = {"cube": f"channels_AR{ar}_TI{ti:+03d}.fits", "ar": ar, "ti": ti, **self.clip(cube)}
+
+        clipped = any(stats[f"{channel}_below"] or stats[f"{channel}_above"] for channel in self.CHANNELS)
+        return cube, stats, thumbnail if self.config["CONTACT_SHEET"] and clipped else None
+
+    def process_cube(self, ar, ti, mfilename, vfilename, ifilename):
+        """
+        Build the data cube of an active region and time interval, and save it in the output directory.
+
+        Parameters:
+            ar (int): Active region.
+            ti (int): Time interval.
+            mfilename, vfilename, ifilename (str): Paths to the magnetogram, divergence and intensity FITS files.
+
+        Returns:
+            tuple: Clip statistics and thumbnail of the cube (see build_cube).
+        """
+        cube, stats, thumbnail = self.build_cube(ar, ti, mfilename, vfilename, ifilename)
+
+        # Write the cube out with the provenance of each channel
+        hdu = fits.PrimaryHDU(data=cube.astype(np.float32))
+        hdr = hdu.header
+        hdr["IM1"]  = mfilename
+        hdr["IM2"]  = vfilename
+        hdr["IM3"]  = ifilename
+        hdr["MFAC"] = self.config["MAGNETOGRAM_FACTOR"]
+        hdr["IFAC"] = self.config["INTENSITY_FACTOR"]
+        hdr["VFAC"] = self.config["DIVERGENCE_FACTOR"]
+        hdu.writeto(os.path.join(self.config["OUTPUT_DIR"], stats["cube"]), overwrite=True)
+        return stats, thumbnail
+
+    def process_chunk(self, entries):
+        """
+        Build the data cubes of a chunk of index entries. An entry that fails is skipped, so it does not abort the rest of the chunk.
+
+        Parameters:
+            entries (list): (AR, TI, magnetogram path, divergence path, intensity path) tuples.
+
+        Returns:
+            tuple: List of the results of process_cube for each cube built, and list of tuples of the cube name and the
+                   error message of each entry that failed.
+        """
+        results, errors = [], []
+        for entry in entries:
+            try:
+                results.append(self.process_cube(*entry))
+            except Exception as e:
+                errors.append((f"AR{entry[0]} TI{entry[1]:+03d}", f"{type(e).__name__}: {e}"))
+        return results, errors
+
+    def save_clip_summary(self, stats, output_dir):
+        """
+        Save the clip statistics of every cube of the run to CLIP_SUMMARY.CSV, or CLIP_SUMMARY.PARQUET if CLIP_SUMMARY_FORMAT
+        is parquet. Parquet requires pyarrow or fastparquet, and the summary is saved as CSV if neither is installed.
+
+        Parameters:
+            stats (list): Clip statistics of each cube, as returned by clip.
+            output_dir (str): Directory in which the summary is saved.
+
+        Returns:
+            pd.DataFrame: The summary table, sorted by active region and time interval.
+        """
+        summary = pd.DataFrame(stats, columns=["cube", "ar", "ti"] + [
+            f"{channel}_{name}" for channel in self.CHANNELS for name in ("min", "max", "below", "above")
+        ]).sort_values(["ar", "ti"])
+
+        if self.config["CLIP_SUMMARY_FORMAT"] == "parquet":
+            summary_path = os.path.join(output_dir, "CLIP_SUMMARY.PARQUET")
+            try:
+                summary.to_parquet(summary_path, index=False)
+                print(f"Clip summary saved to {summary_path}")
+                return summary
+            except ImportError as e:
+                print(f"Could not save the clip summary as Parquet ({e}). Saving it as CSV.")
+
+        summary_path = os.path.join(output_dir, "CLIP_SUMMARY.CSV")
+        summary.to_csv(summary_path, index=False)
+        print(f"Clip summary saved to {summary_path}")
+        return summary
+
+    def save_contact_sheet(self, summary, thumbnails, output_dir):
+        """
+        Render the thumbnails of the CONTACT_SHEET_MAX_CUBES cubes with the largest fraction of clipped pixels to
+        CLIP_CONTACT_SHEET.PNG, one row per cube and one column per channel, on a fixed [-1, 1] color scale.
+
+        Parameters:
+            summary (pd.DataFrame): Clip summary, as returned by save_clip_summary.
+            thumbnails (dict): Thumbnail of each clipped cube, by cube name.
+            output_dir (str): Directory in which the contact sheet is saved.
+        """
+        if not thumbnails:
+            return
+        clipped = sum(summary[f"{channel}_{name}"] for channel in self.CHANNELS for name in ("below", "above"))
+        cubes   = summary.assign(clipped=clipped).sort_values("clipped", ascending=False)
+        cubes   = cubes[cubes["cube"].isin(thumbnails.keys())].head(self.config["CONTACT_SHEET_MAX_CUBES"])
+
+        figure = Figure(figsize=(2 * len(self.CHANNELS), 2 * len(cubes)))
+        axes   = figure.subplots(len(cubes), len(self.CHANNELS), squeeze=False)
+        for row, cube in enumerate(cubes.itertuples(index=False)):
+            for column, channel in enumerate(self.CHANNELS):
+                axes[row, column].imshow(thumbnails[cube.cube][:, :, column], vmin=-1, vmax=1, cmap="RdBu_r")
+                axes[row, column].set_title(f"AR{cube.ar} TI{cube.ti:+03d} {channel}", fontsize=7)
+                axes[row, column].axis("off")
+        figure.tight_layout()
+        sheet_path = os.path.join(output_dir, "CLIP_CONTACT_SHEET.PNG")
+        figure.savefig(sheet_path)
+        print(f"Contact sheet of the {len(cubes)} most clipped cubes saved to {sheet_path}")
+
+    def process_index(self, index, on_result, max_chunks_in_flight=None):
+        """
+        Process every entry of the index with process_chunk.
+
+        With more than one worker (NUM_WORKERS), the index is split into chunks of CHUNK_SIZE entries processed by a pool of
+        processes, with at most max_chunks_in_flight chunks submitted at a time. Entries that fail are logged and
+        skipped, and the progress is reported after every chunk.
+
+        Parameters:
+            index (list): Entries of the index, as returned by build_index.
+            on_result (callable): Function called in this process with the result of process_cube for each cube built.
+            max_chunks_in_flight (int, optional): Maximum number of chunks submitted and not completed. Defaults to twice the number of workers.
+
+        Returns:
+            list: Tuples of the cube name and the error message of each entry that failed.
+        """
+        chunk_size  = self.config["CHUNK_SIZE"]
+        num_workers = self.config["NUM_WORKERS"]
+        chunks      = [index[idx:idx + chunk_size] for idx in range(0, len(index), chunk_size)]
+
+        errors     = []
+        processed  = 0
+        start_time = time.time()
+
+        def report(chunk, chunk_results):
+            nonlocal processed
+            processed += len(chunk)
+            results, chunk_errors = chunk_results
+            for result in results:
+                on_result(result)
+            for name, error in chunk_errors:
+                print(f"Skipped {name}: {error}")
+            errors.extend(chunk_errors)
+            elapsed = time.time() - start_time
+            print(f"Processed {processed}/{len(index)} cubes ({processed / elapsed:.1f} cubes/sec), {len(errors)} failed")
+
+        if num_workers <= 1:
+            for chunk in chunks:
+                report(chunk, self.process_chunk(chunk))
+        else:
+            max_chunks_in_flight = max_chunks_in_flight or 2 * num_workers
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                pending = {}
+                for chunk in chunks:
+                    if len(pending) >= max_chunks_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            report(pending.pop(future), future.result())
+                    pending[executor.submit(self.process_chunk, chunk)] = chunk
+                for future in wait(pending).done:
+                    report(pending.pop(future), future.result())
+        return errors
+
+    def keep_thumbnail(self, thumbnails, stats, thumbnail):
+        """
+        Keep the thumbnail of a cube if it is among the CONTACT_SHEET_MAX_CUBES most clipped cubes so far, so only the
+        thumbnails shown on the contact sheet are held in memory while the chunks come back.
+
+        Parameters:
+            thumbnails (list): Heap of (fraction of clipped pixels, cube name, thumbnail) tuples, updated in place.
+            stats (dict): Clip statistics of the cube, as returned by clip.
+            thumbnail (np.array): Thumbnail of the cube (see build_cube), or None.
+        """
+        if thumbnail is None:
+            return
+        clipped = sum(stats[f"{channel}_{name}"] for channel in self.CHANNELS for name in ("below", "above"))
+        entry   = (clipped, stats["cube"], thumbnail)
+        if len(thumbnails) < self.config["CONTACT_SHEET_MAX_CUBES"]:
+            heapq.heappush(thumbnails, entry)
+        elif thumbnails and entry[:2] > thumbnails[0][:2]:
+            heapq.heapreplace(thumbnails, entry)
+
+    def report_clipping(self, stats, thumbnails, output_dir):
+        """
+        Save the clip statistics of the run, with a contact sheet of the most clipped cubes if CONTACT_SHEET is enabled.
+
+        Parameters:
+            stats (list): Clip statistics of each cube, as returned by clip.
+            thumbnails (list): Heap of the thumbnails of the most clipped cubes, as kept by keep_thumbnail.
+            output_dir (str): Directory in which the summary and the contact sheet are saved.
+        """
+        summary = self.save_clip_summary(stats, output_dir)
+        clipped = sum(summary[f"{channel}_{name}"] for channel in self.CHANNELS for name in ("below", "above")) > 0
+        print(f"{int(clipped.sum())} of {len(summary)} cubes had values outside [-1, 1] and were clipped.")
+        if self.config["CONTACT_SHEET"]:
+            self.save_contact_sheet(summary, {cube: thumbnail for _, cube, thumbnail in thumbnails}, output_dir)
+
+    def run(self, max_chunks_in_flight=None):
+        """
+        Main method to build the data cubes of every (AR, TI) of the index, in parallel if NUM_WORKERS is more than 1
+        (see process_index). The clip statistics of the run are saved at the end (see report_clipping).
+
+        Parameters:
+            max_chunks_in_flight (int, optional): Maximum number of chunks submitted and not completed. Defaults to twice the number of workers.
+
+        Returns:
+            list: Tuples of the cube name and the error message of each entry that failed.
+        """
+        start_time = time.time()
+        index      = self.build_index()
+        print(f"Found {len(index)} (AR, TI) with all three files in {time.time() - start_time:.1f} sec.")
+        os.makedirs(self.config["OUTPUT_DIR"], exist_ok=True)
+
+        stats      = []
+        thumbnails = []
+
+        def collect(result):
+            cube_stats, thumbnail = result
+            stats.append(cube_stats)
+            self.keep_thumbnail(thumbnails, cube_stats, thumbnail)
+
+        errors = self.process_index(index, collect, max_chunks_in_flight)
+        self.report_clipping(stats, thumbnails, self.config["OUTPUT_DIR"])
+
+        print(f"Done: {len(stats)} cubes written to {self.config['OUTPUT_DIR']} and {len(errors)} skipped in {time.time() - start_time:.1f} sec.")
+        return errors
+
+def create_argument_parser(description):
+    """
+    Create the parser of the command line arguments shared by the data cube scripts. Any argument given overrides
+    the value of the configuration file (see apply_arguments).
+
+    Parameters:
+        description (str): Description of the script.
+
+    Returns:
+        argparse.ArgumentParser: The argument parser.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--config", default=PreProcessFITSThree.CONFIG_PATH, help="Path to the configuration file.")
+    parser.add_argument("--magnetogram-dir", help="Directory of the averaged magnetograms.")
+    parser.add_argument("--intensity-dir", help="Directory of the averaged intensity maps.")
+    parser.add_argument("--divergence-dir", help="Directory of the HOLOG_AR<ar> divergence subdirectories.")
+    parser.add_argument("--ar-lists", nargs="*", help="Files whose first column lists the active regions to process.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes.")
+    parser.add_argument("--contact-sheet", action="store_true", default=None, help="Render a contact sheet of the most clipped cubes.")
+    return parser
+
+def apply_arguments(config, arguments, overrides=None):
+    """
+    Override the values of the configuration with the command line arguments that were given.
+
+    Parameters:
+        config (dict): Configuration, as returned by PreProcessFITSThree.load_config.
+        arguments (argparse.Namespace): Arguments parsed by a parser from create_argument_parser.
+        overrides (dict, optional): Additional configuration values of script-specific arguments. Defaults to None.
+
+    Returns:
+        dict: The updated configuration.
+    """
+    overrides = {
+        "MAGNETOGRAM_DIR": arguments.magnetogram_dir,
+        "INTENSITY_DIR":   arguments.intensity_dir,
+        "DIVERGENCE_DIR":  arguments.divergence_dir,
+        "AR_LISTS":        arguments.ar_lists,
+        "NUM_WORKERS":     arguments.workers,
+        "CONTACT_SHEET":   arguments.contact_sheet,
+        **(overrides or {}),
+    }
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
 
-# RUN
-# > three_fits_processor.py
-#
-
-def distance_to_disk_centre(crlt_obs, crln_obs, crlt_ref, crln_ref):
-    # input values in degrees
-
-    # convert to radians
-    crln_ref=crln_ref*np.pi/180.
-    crlt_ref=crlt_ref*np.pi/180.
-    crln_obs=crln_obs*np.pi/180.
-    crlt_obs=crlt_obs*np.pi/180.
-    
-    dlon=abs(crln_obs-crln_ref)
-    
-    distance=math.acos( math.sin(crlt_obs)*math.sin(crlt_ref) + math.cos(crlt_obs)*math.cos(crlt_ref)*math.cos(dlon)  )
-    #distance=acos( cos(!dpi/2.-CRLT_OBS)*cos(!dpi/2.-CRLT_REF) + sin(!dpi/2.-CRLT_OBS)*sin(!dpi/2.-CRLT_REF)*cos(dlon)  )
-    return distance # in radians    (*180./!dpi for degrees)
-
-def remove_2dplane(array):
-    m=array.shape[0] # assume it is square!
-
-    X1, X2 = np.mgrid[:m, :m]
-    X = np.hstack(   ( np.reshape(X1, (m*m, 1)) , np.reshape(X2, (m*m, 1)) ) )
-    X = np.hstack(   ( np.ones((m*m, 1)) , X ))
-    YY = np.reshape(array, (m*m, 1))
-    theta = np.dot(np.dot( np.linalg.pinv(np.dot(X.transpose(), X)), X.transpose()), YY)
-    plane = np.reshape(np.dot(X, theta), (m, m));
-    sub = array - plane
-            
-    #plt.imshow(array)
-    #plt.show()
-    #plt.imshow(sub)
-    #plt.show()
-    return sub
-
-######  START CODE PROPER  #######
-
-
-######  HARD CODED STUFF  #######
-ODIR='/Users/schunker/OneDrive/RESEARCH/EARS/ChannelCubes/' # output directory
-m=256 # pixels, crop size of output maps
-MDIR='/Users/schunker/Sol/AVEM/'
-mfac=4000. # gauss
-IDIR='/Users/schunker/Sol/AVEIC/'
-ifac=50000.   # ?
-VDIR='/Users/schunker/Sol/HOLOG_EARS/'
-vfac=100.   # cm/s
-
-# get list of active regions to loop over
-h1='/Users/schunker/OneDrive/RESEARCH/EARS/HARP_output_good.txt'
-data = ascii.read(h1) 
-#print(data)
-# columns are
-# ar, harp, t0_TAI, t0_days,  latitude (degrees),   longitude (degrees),   CMD (degrees)
-arc = data['col1']
-ars = arc.data
-h2='/Users/schunker/OneDrive/RESEARCH/EARS/HARP_output_good_set2.txt'
-data = ascii.read(h2)
-arc = data['col1']
-arc = arc.data
-ars=np.append(ars,arc)
-#print(ars)
-
-# up to 11242
-ars=ars[49:]
-
-################################################
-# loop over EARS 
-for ar in ars:
-    ar_str=str(ar)
-
-    # loop over time intervals manually
-    for ti in range(-20,29):
-        ti_str=str(ti)
-       
-        # read in average magnetogram        
-        mfilename=MDIR+'mps_schunker.avem_ears_AR'+ar_str+'_TI'+ti_str+'_QSUN0.fits'
-                   
-        # read in corresponding intensity        
-        ifilename=IDIR+'mps_schunker.aveic_ears_AR'+ar_str+'_TI'+ti_str+'_QSUN0.fits'   
-               
-        # read in divergence map
-        if ti >= 0:
-            ti_str='+'+"{:02d}".format(ti)
-        if ti < 0:
-            ti_str="{:03d}".format(ti)
-            
-        vfiles=VDIR+'HOLOG_AR'+ar_str+'/DT_OI_TD3_*TI'+ti_str
-
-        # if all the files exist then go through and make a 3-channel datacube
-        if glob.glob(vfiles) and os.path.isfile(ifilename) and os.path.isfile(mfilename):
-            print(ifilename)       
-            hdu=fits.open(ifilename)
-            idata = hdu[1].data
-            print(idata.shape)
-        
-            print(mfilename)
-            hdu=fits.open(mfilename)
-            mdata = hdu[1].data
-            print(mdata.shape)
-            mhdr = hdu[1].header
-            # divide by cos theta
-            theta = distance_to_disk_centre(mhdr['CRLT_OBS'], mhdr['CRLN_OBS'], mhdr['CRLT_REF'], mhdr['CRLN_REF'])
-            if theta*180/np.pi > 80:
-                print("WARNING: distance to disk is greater than 60 degrees! theta = ",theta*180/np.pi," degrees. Exiting.")
-                exit()
-            mdata = mdata / math.cos(theta)
-            
-            junk= glob.glob(vfiles)
-            vfilename=junk[0] # assuming there is only one file
-            print(vfilename)
-            hdu=fits.open(vfilename)
-            vdata = hdu[0].data
-            print(vdata.shape)
-            # strictly should also filter flows
-        
-            # crop all to 256x256
-            idata = idata[int(m-m/2):int(m+m/2),int(m-m/2):int(m+m/2)]
-            mdata = mdata[int(m-m/2):int(m+m/2),int(m-m/2):int(m+m/2)]
-            vdata = vdata[int(m-m/2):int(m+m/2),int(m-m/2):int(m+m/2)]
-
-            # remove background mean from intensity
-            #X1, X2 = np.mgrid[:m, :m]
-            #X = np.hstack(   ( np.reshape(X1, (m*m, 1)) , np.reshape(X2, (m*m, 1)) ) )
-            #X = np.hstack(   ( np.ones((m*m, 1)) , X ))
-            #YY = np.reshape(idata, (m*m, 1))
-            #theta = np.dot(np.dot( np.linalg.pinv(np.dot(X.transpose(), X)), X.transpose()), YY)
-            #plane = np.reshape(np.dot(X, theta), (m, m));
-            isub = remove_2dplane(idata)
-            
-            
-            print(' IC range: ',np.min(isub),np.max(isub))
-            print(' B range: ',np.min(mdata),np.max(mdata))
-            print(' V range: ',np.min(vdata),np.max(vdata))
-        
-            # normalise
-            isub = isub / ifac
-            mdata = mdata / mfac
-            vdata = vdata / vfac
-
-            # show an image and close it straight away
-            #plt.imshow(vdata)
-            #plt.show(block=False)
-            #plt.pause(0.1)
-            #plt.close()
-            #plt.imshow(isub)
-            #plt.show(block=False)
-            #plt.pause(0.1)
-            #plt.close()
-            
-            print(' IC norm range: ',np.min(isub),np.max(isub))
-            print(' B norm range: ',np.min(mdata),np.max(mdata))
-            print(' V norm range: ',np.min(vdata),np.max(vdata))
-        
-            if np.min(isub) < -1 or np.min(mdata) < -1 or np.min(vdata) < -1:
-                print('WARNING: minimum value of something is less than -1. Not good for pix2pix. Truncating.')
-                plt.imshow(vdata)
-                plt.show(block=False)
-                plt.pause(0.1)
-                plt.close()
-                
-                plt.imshow(isub)
-                plt.show(block=False)
-                plt.pause(0.1)
-                plt.close()
-                
-                zz = np.where(isub < -1)
-                isub[zz] = -1
-                zz = np.where(mdata < -1)
-                mdata[zz] = -1
-                zz = np.where(vdata < -1)
-                vdata[zz] = -1
-                
-            if  np.max(isub) > 1 or np.max(mdata) > 1 or np.max(vdata) > 1:
-                print('WARNING: maximum value of something is greater than 1. Not good for pix2pix. Truncating.')
-                plt.imshow(vdata)
-                plt.show(block=False)
-                plt.pause(0.1)
-                plt.close()
-
-                plt.imshow(isub)
-                plt.show(block=False)
-                plt.pause(0.1)
-                plt.close()
-                
-                zz = np.where(isub > 1)
-                isub[zz] = 1
-                zz = np.where(mdata > 1)
-                mdata[zz] = 1
-                zz = np.where(vdata > 1)
-                vdata[zz] = 1
-                
-
-            # create 3D datacube and write out
-            cube=np.dstack((mdata,vdata,isub))
-            print(cube.shape)
-
-            ofile=ODIR+"channels_AR"+ar_str+"_TI"+ti_str+".fits"
-            print("Writing "+ofile+"...")
-            hdu = fits.PrimaryHDU(data=cube)
-            hdr = hdu.header
-            hdr['IM1'] = mfilename
-            hdr['IM2'] = vfilename
-            hdr['IM3'] = ifilename
-            hdr['MFAC'] = mfac
-            hdr['IFAC'] = ifac
-            hdr['VFAC'] = vfac
-            
-            #    fits.writeto(odir+"slice_tau_1.000_"+var+".fits",cube,overwrite=True)
-            hdu.writeto(ofile,overwrite=True)
-
-                
-print('Done')
\ No newline at end of file
+if __name__ == "__main__":
+    parser = create_argument_parser("Build 3-channel (magnetogram, divergence, intensity) data cubes for pix2pix.")
+    parser.add_argument("--output-dir", help="Directory in which the data cubes are written.")
+    arguments = parser.parse_args()
+    config    = apply_arguments(PreProcessFITSThree.load_config(arguments.config), arguments, {"OUTPUT_DIR": arguments.output_dir})
+    PreProcessFITSThree(config).run()
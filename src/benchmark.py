@@ -0,0 +1,154 @@
+import time
+import numpy as np
+import tensorflow as tf
+
+from data.dataset import Dataset
+from prettytable import PrettyTable
+from pix2pix.generator import Generator
+from data.data_loader import DataLoader
+from pix2pix.inference import InferenceGenerator
+
+class Benchmark:
+    """
+    A class to measure the throughput of the components of the application.
+    """
+
+    @staticmethod
+    def measure_throughput(dataset, num_batches, warmup_batches=2):
+        """
+        Measures the number of images per second produced by a dataset.
+
+        Args:
+            dataset (tf.data.Dataset): Dataset yielding (name, input, target) batches.
+            num_batches (int): Number of batches to time.
+            warmup_batches (int, optional): Number of batches to consume before timing. Defaults to 2.
+
+        Returns:
+            float: Images per second.
+        """
+        iterator = iter(dataset.repeat())
+        for _ in range(warmup_batches):
+            next(iterator)
+
+        num_images = 0
+        start      = time.perf_counter()
+        for _ in range(num_batches):
+            _, input_image, _ = next(iterator)
+            num_images += int(input_image.shape[0])
+        return num_images / (time.perf_counter() - start)
+
+    @staticmethod
+    def compare_pipelines(csv_path, batch_size=1, num_batches=100):
+        """
+        Compares the throughput of the available input pipelines on the given pairs.
+
+        Args:
+            csv_path (str): Path to the CSV file containing image pairs.
+            batch_size (int, optional): Number of samples per batch. Defaults to 1.
+            num_batches (int, optional): Number of batches to time per pipeline. Defaults to 100.
+
+        Returns:
+            dict: Images per second for each pipeline.
+        """
+        results = {}
+        for pipeline in Dataset.PIPELINES:
+            dataset           = Dataset(DataLoader(csv_path, csv_path), batch_size=batch_size, pipeline=pipeline).create_dataset()
+            results[pipeline] = Benchmark.measure_throughput(dataset, num_batches)
+
+        baseline = results["py_function"]
+        table    = PrettyTable()
+        table.field_names = ["Pipeline", "Images/sec", "Speedup"]
+        for pipeline, images_per_sec in results.items():
+            table.add_row([pipeline, f"{images_per_sec:.2f}", f"{images_per_sec / baseline:.2f}x"])
+        print(table)
+        return results
+
+    @staticmethod
+    def measure_latency(predict, input_image, num_batches, warmup_batches=2):
+        """
+        Measures the mean time taken to predict a batch.
+
+        Args:
+            predict (callable): Function predicting the output images for a batch of input images.
+            input_image (tf.Tensor): Batch of input images.
+            num_batches (int): Number of batches to time.
+            warmup_batches (int, optional): Number of batches to predict before timing. Defaults to 2.
+
+        Returns:
+            float: Milliseconds per batch.
+        """
+        for _ in range(warmup_batches):
+            predict(input_image).numpy()
+
+        start = time.perf_counter()
+        for _ in range(num_batches):
+            predict(input_image).numpy()
+        return 1000 * (time.perf_counter() - start) / num_batches
+
+    @staticmethod
+    def compare_generators(checkpoint_path=None, batch_size=1, num_batches=20):
+        """
+        Compares the latency and the outputs of the generator and of its folded inference version (see pix2pix.inference).
+        Without a checkpoint, the batch normalization statistics of the generator are randomized, so the folding
+        is not trivial.
+
+        Args:
+            checkpoint_path (str, optional): Path to a training checkpoint to restore the generator from. Defaults to None.
+            batch_size (int, optional): Number of samples per batch. Defaults to 1.
+            num_batches (int, optional): Number of batches to time per model. Defaults to 20.
+
+        Returns:
+            dict: Milliseconds per batch and maximum absolute difference to the generator in inference mode, for each model.
+        """
+        generator = Generator()
+        generator.build_model()
+        if checkpoint_path:
+            tf.train.Checkpoint(generator=generator.model).restore(checkpoint_path).expect_partial()
+        else:
+            rng = np.random.default_rng(0)
+            for layer in generator.model.submodules:
+                if isinstance(layer, tf.keras.layers.BatchNormalization):
+                    channels = layer.gamma.shape[0]
+                    layer.set_weights([
+                        rng.uniform(0.5, 1.5, channels),
+                        rng.normal(0.0, 0.1, channels),
+                        rng.normal(0.0, 0.1, channels),
+                        rng.uniform(0.5, 1.5, channels),
+                    ])
+
+        input_image = tf.random.uniform([batch_size] + list(generator.model.input_shape[1:]), -1.0, 1.0, seed=0)
+        # The generator called with training=True updates its moving statistics, so it is timed last
+        models      = {
+            "Generator (training=False)" : tf.function(lambda x: generator.model(x, training=False)),
+            "InferenceGenerator"         : InferenceGenerator(generator),
+            "Generator (training=True)"  : tf.function(lambda x: generator.model(x, training=True)),
+        }
+        reference = models["Generator (training=False)"](input_image)
+
+        results = {}
+        for name, predict in models.items():
+            results[name] = {
+                "latency"  : Benchmark.measure_latency(predict, input_image, num_batches),
+                "max_diff" : float(tf.reduce_max(tf.abs(predict(input_image) - reference))),
+            }
+
+        baseline = results["Generator (training=True)"]["latency"]
+        table    = PrettyTable()
+        table.field_names = ["Model", "ms/batch", "Speedup", "Max abs diff (vs training=False)"]
+        for name, result in results.items():
+            table.add_row([name, f"{result['latency']:.2f}", f"{baseline / result['latency']:.2f}x", f"{result['max_diff']:.2e}"])
+        print(table)
+        return results
+
+if __name__ == "__main__":
+    benchmark = input("Do you want to benchmark the input pipelines or the generator? (p/g): ").strip().lower()
+    if benchmark == "g":
+        checkpoint_path = input("Enter the path to a checkpoint (./path/to/checkpoint/ckpt-n), or leave empty for random weights: ").strip()
+        batch_size      = int(input("Enter the batch size: "))
+        num_batches     = int(input("Enter the number of batches to time: "))
+        Benchmark.compare_generators(checkpoint_path or None, batch_size, num_batches)
+    else:
+        csv_path    = input("Enter the path to the pairs.csv file: ")
+        batch_size  = int(input("Enter the batch size: "))
+        num_batches = int(input("Enter the number of batches to time: "))
+        Benchmark.compare_pipelines(csv_path, batch_size, num_batches)
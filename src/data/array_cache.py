@@ -0,0 +1,99 @@
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+class ArrayCache:
+    """
+    ArrayCache class implementing a thread-safe least recently used (LRU) cache of numpy arrays,
+    bounded by the total number of bytes held.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        Initializes the ArrayCache with the given byte budget.
+
+        Args:
+        - max_bytes (int): Maximum number of bytes held by the cache. A value of 0 disables caching.
+        """
+        self.max_bytes     = max_bytes
+        self.current_bytes = 0
+        self.hits          = 0
+        self.misses        = 0
+        self._entries      = OrderedDict()
+        self._lock         = threading.Lock()
+
+    def get(self, key):
+        """
+        Retrieves an array from the cache and marks it as most recently used.
+
+        Args:
+        - key (str): Key of the array.
+
+        Returns:
+        - numpy.ndarray: The cached array, or None if the key is not cached.
+        """
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        """
+        Adds an array to the cache, evicting the least recently used arrays to stay within the byte budget.
+        Arrays larger than the budget are not cached.
+
+        Args:
+        - key (str): Key of the array.
+        - array (numpy.ndarray): Array to cache. It is made read-only, since it is shared between callers.
+        """
+        if array.nbytes > self.max_bytes:
+            return
+
+        array.setflags(write=False)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+
+            self._entries[key]  = array
+            self.current_bytes += array.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted          = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def get_or_load(self, key, loader):
+        """
+        Retrieves an array from the cache, loading and caching it on a miss.
+
+        Args:
+        - key (str): Key of the array.
+        - loader (callable): Function called with the key to load the array on a miss.
+
+        Returns:
+        - numpy.ndarray: The requested array.
+        """
+        array = self.get(key)
+        if array is None:
+            array = np.asarray(loader(key), dtype=np.float32)
+            self.put(key, array)
+        return array
+
+    @property
+    def hit_rate(self):
+        """
+        Returns the fraction of lookups served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """
+        Prints the hit and miss counters and the memory used by the cache.
+        """
+        print(f"Image cache: {self.hits} hits, {self.misses} misses ({100 * self.hit_rate:.1f}% hit rate), "
+              f"{len(self._entries)} arrays using {self.current_bytes / 2**20:.1f} of {self.max_bytes / 2**20:.1f} MiB")
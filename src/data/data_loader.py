@@ -1,25 +1,55 @@
+import json
 import pathlib
 import pandas as pd
 import tensorflow as tf
 
+from data.shard_store import ShardStore
+from data.array_cache import ArrayCache
 from utils.image_processor import ImageProcessor
 
 class DataLoader:
     """
     DataLoader class for loading and processing FITS image files.
+
+    The images may also be stored in a dataset store built by preprocessing/data_cube/store_builder.py, in which
+    case a store.json file next to the pairs CSV file gives the directory of the store.
     """
+
+    # File pointing to the dataset store holding the images of the pairs
+    STORE_POINTER_NAME = ShardStore.STORE_POINTER_NAME
     
-    def __init__(self, dataset_directory, csv_path):
+    def __init__(self, dataset_directory, csv_path, cache_bytes=0):
         """
         Initializes the DataLoader with the dataset directory and CSV path.
         
         Args:
         - dataset_directory (str): Path to the directory containing the dataset.
         - csv_path (str): Path to the CSV file containing image pairs.
+        - cache_bytes (int, optional): Byte budget of the cache of decoded images. Defaults to 0 (disabled).
         """
         self.dataset_directory = pathlib.Path(dataset_directory).parent
         self.pairs             = pd.read_csv(csv_path)
-        self.pairs             = self.pairs.sample(frac=1).reset_index(drop=True)
+        self.store_dir         = self.find_store(csv_path)
+
+        # Consecutive pairs share a file (the target of one pair is the input of the next),
+        # so caching decoded images avoids most repeated FITS reads
+        self.cache = ArrayCache(cache_bytes) if cache_bytes > 0 else None
+
+    def find_store(self, csv_path):
+        """
+        Finds the dataset store holding the images of the pairs, if any.
+
+        Args:
+        - csv_path (str): Path to the CSV file containing image pairs.
+
+        Returns:
+        - str: Directory of the dataset store, or None if the images are FITS files in the dataset directory.
+        """
+        pointer_path = pathlib.Path(csv_path).parent / self.STORE_POINTER_NAME
+        if not pointer_path.exists():
+            return None
+        with open(pointer_path, "r") as file:
+            return json.load(file)["store"]
 
     def load(self, image_file):
         """
@@ -31,12 +61,36 @@ class DataLoader:
         Returns:
         - tf.Tensor: Tensor representation of the image data.
         """
+        image_file_path = self.get_file_path(image_file)
+        data = tf.py_function(func=self._load_image, inp=[str(image_file_path)], Tout=tf.float32)
+        return tf.convert_to_tensor(data, dtype=tf.float32)
+
+    def get_file_path(self, image_file):
+        """
+        Resolves the path of an image file listed in the pairs CSV.
+        
+        Args:
+        - image_file (str): Name of the image file.
+        
+        Returns:
+        - pathlib.Path: Path to the image file in the dataset directory.
+        """
         # Ensure the image file has the correct extension
         if not image_file.endswith('.fits'):
             image_file += '.fits'
-        image_file_path = self.dataset_directory / image_file
-        data = tf.py_function(func=self._load_image, inp=[str(image_file_path)], Tout=tf.float32)
-        return tf.convert_to_tensor(data, dtype=tf.float32)
+        return self.dataset_directory / image_file
+
+    def get_file_paths(self):
+        """
+        Lists the names and file paths of all image pairs.
+        
+        Returns:
+        - tuple: Lists of input image names, input image paths and real image paths.
+        """
+        input_names = [str(name) for name in self.pairs.iloc[:, 0]]
+        input_paths = [str(self.get_file_path(name)) for name in input_names]
+        real_paths  = [str(self.get_file_path(str(name))) for name in self.pairs.iloc[:, 1]]
+        return input_names, input_paths, real_paths
 
     def _load_image(self, image_file_path_tensor):
         """
@@ -49,7 +103,10 @@ class DataLoader:
         - data: Data read from the FITS image file.
         """
         image_file_path = image_file_path_tensor.numpy().decode('utf-8')
-        data            = ImageProcessor().read_fits(image_file_path)
+        if self.cache is not None:
+            return self.cache.get_or_load(image_file_path, ImageProcessor.read_fits)
+
+        data = ImageProcessor().read_fits(image_file_path)
         if data is None:
             print(f"Data is None for file: {image_file_path}")
         return data
@@ -1,33 +1,251 @@
+import os
 import tensorflow as tf
 
+from data.shard_store import ShardStore
+from data.fits_decoder import FITSDecoder
+from data.dataset_compiler import DatasetCompiler
+
 class Dataset:
     """
     Dataset class for creating a TensorFlow dataset from a data loader.
     """
-    
-    def __init__(self, data_loader, buffer_size=400, batch_size=1):
+
+    # Supported input pipelines
+    PIPELINES = ("py_function", "native", "tfrecord", "memmap")
+
+    def __init__(self, data_loader, buffer_size=400, batch_size=1, pipeline="py_function", cache_dir="./cache", num_shards=8, shuffle=False, seed=None, variable_resolution=False, repeat=False, start_step=0):
         """
         Initializes the Dataset with the given data loader, buffer size, and batch size.
-        
+
         Args:
         - data_loader (DataLoader): An instance of the DataLoader class to load image data.
         - buffer_size (int, optional): Size of the buffer for shuffling the dataset. Defaults to 400.
         - batch_size (int, optional): Number of samples per batch. Defaults to 1.
+        - pipeline (str, optional): Input pipeline to use, one of "py_function", "native", "tfrecord" or "memmap". Defaults to "py_function".
+        - cache_dir (str, optional): Directory of the compiled datasets used by the "tfrecord" and "memmap" pipelines. Defaults to "./cache".
+        - num_shards (int, optional): Number of shards written when compiling the dataset. Defaults to 8.
+        - shuffle (bool, optional): Whether to shuffle the pairs, with a new order on every iteration. Defaults to False.
+        - seed (int, optional): Seed of the shuffle, for a reproducible sequence of orders. Defaults to None.
+        - variable_resolution (bool, optional): Whether the images may have any height and width, for variable-resolution
+                                                models. Images of different sizes then require a batch size of 1. Defaults to False.
+        - repeat (bool, optional): Whether to repeat the pairs endlessly, for training. Each epoch is then shuffled with
+                                   seed + epoch, so the order only depends on the seed and the position in the stream. Defaults to False.
+        - start_step (int, optional): Number of batches of the endless stream to skip, to resume training at this step. Defaults to 0.
         """
+        if pipeline not in self.PIPELINES:
+            print(50*"-")
+            print(f"Unknown input pipeline: {pipeline}. Expected one of {self.PIPELINES}.")
+            raise ValueError
+
         self.data_loader = data_loader
         self.buffer_size = buffer_size
         self.batch_size  = batch_size
+        self.pipeline    = pipeline
+        self.cache_dir   = cache_dir
+        self.num_shards  = num_shards
+        self.shuffle     = shuffle
+        self.seed        = seed
+        self.repeat      = repeat
+        self.start_step  = start_step
+        self.image_shape = (None, None, 3) if variable_resolution else (256, 256, 3)
 
     def create_dataset(self):
         """
         Creates a TensorFlow dataset using the data loader.
-        
+
         Returns:
         - tf.data.Dataset: A TensorFlow dataset containing image pairs.
         """
+        # Pairs from a dataset store have no FITS files, whatever the pipeline
+        if self.data_loader.store_dir is not None:
+            return self._create_store_dataset()
+        if self.pipeline == "native":
+            return self._create_native_dataset()
+        if self.pipeline == "tfrecord":
+            return self._create_tfrecord_dataset()
+        if self.pipeline == "memmap":
+            return self._create_memmap_dataset()
+
         num_pairs = len(self.data_loader.pairs)
         dataset   = tf.data.Dataset.range(num_pairs)
+        dataset   = self._shuffle(dataset, num_pairs)
         dataset   = dataset.map(lambda idx: tf.py_function(self.data_loader.load_image_pair, [idx], [tf.string, tf.float32, tf.float32]))
         dataset   = dataset.batch(self.batch_size)
-        
+
+        return dataset
+
+    def _shuffle(self, dataset, num_elements):
+        """
+        Adds a streaming shuffle stage to the dataset if shuffling is enabled, and repeats it if repeat is set.
+        The shuffle is applied to indices, paths or serialized records, so only the shuffle buffer is held in
+        memory, never the whole dataset.
+
+        Without repeat, the order changes on every iteration of the dataset. With repeat, epoch e is shuffled with
+        seed + e, and the first start_step * batch_size elements of the stream are skipped here, before any image is
+        read. Training resumed at a step therefore sees the same pairs as an uninterrupted run, with only the step
+        saved in the checkpoint. Without a seed, resumed training continues with a new order.
+
+        Args:
+        - dataset (tf.data.Dataset): Dataset to shuffle.
+        - num_elements (int): Number of elements of the dataset.
+
+        Returns:
+        - tf.data.Dataset: The shuffled dataset.
+        """
+        if not self.repeat:
+            if not self.shuffle:
+                return dataset
+            return dataset.shuffle(self.buffer_size, seed=self.seed, reshuffle_each_iteration=True)
+
+        def epoch_dataset(epoch):
+            if not self.shuffle:
+                return dataset
+            seed = None if self.seed is None else self.seed + epoch
+            return dataset.shuffle(self.buffer_size, seed=seed, reshuffle_each_iteration=False)
+
+        # The stream is endless, so every batch is full and each step consumes exactly batch_size elements
+        offset = self.start_step * self.batch_size
+        return tf.data.Dataset.counter(offset // num_elements).flat_map(epoch_dataset).skip(offset % num_elements)
+
+    def _create_native_dataset(self):
+        """
+        Creates a TensorFlow dataset that reads and decodes the FITS files with native TensorFlow ops.
+        File reads are interleaved, decoding runs in parallel and batches are prefetched, so no Python
+        code runs per element.
+
+        Returns:
+        - tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        input_names, input_paths, real_paths = self.data_loader.get_file_paths()
+
+        dataset = tf.data.Dataset.from_tensor_slices((input_names, input_paths, real_paths))
+        dataset = self._shuffle(dataset, len(input_names))
+        dataset = dataset.interleave(
+            lambda name, input_path, real_path: tf.data.Dataset.from_tensors(
+                (name, tf.io.read_file(input_path), tf.io.read_file(real_path))
+            ),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+        dataset = dataset.map(
+            lambda name, input_contents, real_contents: (
+                name,
+                FITSDecoder.decode(input_contents, self.image_shape),
+                FITSDecoder.decode(real_contents, self.image_shape),
+            ),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+        dataset = dataset.batch(self.batch_size)
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
+        return dataset
+
+    @staticmethod
+    def _parse_record(record):
+        """
+        Parses a record written by the DatasetCompiler.
+
+        Args:
+        - record (tf.Tensor): Serialized tf.train.Example.
+
+        Returns:
+        - tuple: Tuple containing the name of the input image and the input and real image tensors.
+        """
+        features = tf.io.parse_single_example(record, {
+            "name"   : tf.io.FixedLenFeature([], tf.string),
+            "input"  : tf.io.FixedLenFeature([], tf.string),
+            "target" : tf.io.FixedLenFeature([], tf.string),
+            "shape"  : tf.io.FixedLenFeature([3], tf.int64),
+        })
+        input_image = tf.reshape(tf.io.decode_raw(features["input"], tf.float32), features["shape"])
+        real_image  = tf.reshape(tf.io.decode_raw(features["target"], tf.float32), features["shape"])
+        return features["name"], input_image, real_image
+
+    def _create_tfrecord_dataset(self):
+        """
+        Creates a TensorFlow dataset that streams the pre-decoded TFRecord shards of the compiled dataset.
+        The dataset is compiled first if no up-to-date compiled dataset exists in the cache directory.
+
+        Returns:
+        - tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        compiled_dir = DatasetCompiler(self.data_loader, self.cache_dir, self.num_shards).compile()
+        manifest     = DatasetCompiler.load_manifest(compiled_dir)
+        shard_paths  = [os.path.join(compiled_dir, shard) for shard in manifest["shards"]]
+        image_shape  = manifest["image_shape"]
+
+        # All shards are read in turn, so a single shuffle of the records mixes the shards
+        dataset = tf.data.Dataset.from_tensor_slices(shard_paths)
+        dataset = dataset.interleave(
+            tf.data.TFRecordDataset,
+            cycle_length       = len(shard_paths),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+        dataset = self._shuffle(dataset, manifest["num_pairs"])
+        dataset = dataset.map(self._parse_record, num_parallel_calls=tf.data.AUTOTUNE)
+        dataset = dataset.map(lambda name, input_image, real_image: (
+            name,
+            tf.ensure_shape(input_image, image_shape),
+            tf.ensure_shape(real_image, image_shape),
+        ))
+        dataset = dataset.batch(self.batch_size)
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
+        return dataset
+
+    def _create_memmap_dataset(self):
+        """
+        Creates a TensorFlow dataset that reads the images from the memory-mapped .npy shards of the
+        compiled dataset. The dataset is compiled first if no up-to-date compiled dataset exists.
+
+        Returns:
+        - tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        compiled_dir = DatasetCompiler(self.data_loader, self.cache_dir, self.num_shards, "npy").compile()
+        manifest     = DatasetCompiler.load_manifest(compiled_dir)
+        return self._create_shard_store_dataset(ShardStore(compiled_dir, manifest), manifest["pairs"], manifest["image_shape"])
+
+    def _create_store_dataset(self):
+        """
+        Creates a TensorFlow dataset that reads the images from the memory-mapped .npy shards of the dataset
+        store of the data loader, built by preprocessing/data_cube/store_builder.py. No compilation is needed.
+
+        Returns:
+        - tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        store_dir = self.data_loader.store_dir
+        manifest  = DatasetCompiler.load_manifest(store_dir)
+        pairs     = [[str(input_file), str(input_file), str(real_file)] for input_file, real_file in self.data_loader.pairs.itertuples(index=False)]
+        return self._create_shard_store_dataset(ShardStore(store_dir, manifest), pairs, manifest["image_shape"])
+
+    def _create_shard_store_dataset(self, store, pairs, image_shape):
+        """
+        Creates a TensorFlow dataset that reads the images of the pairs from a ShardStore. The images are
+        stored in native byte order, so they are read without decoding or byte swapping, and copied once into their batch.
+
+        Args:
+        - store (ShardStore): Store holding the images.
+        - pairs (list): List of [input name, input file, real file] of each pair, the files being names in the store.
+        - image_shape (list): Shape of the images of the store.
+
+        Returns:
+        - tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        def load_pair(index):
+            input_name, input_file, real_file = pairs[int(index)]
+            return input_name, store.get_tensor(input_file), store.get_tensor(real_file)
+
+        dataset = tf.data.Dataset.range(len(pairs))
+        dataset = self._shuffle(dataset, len(pairs))
+        dataset = dataset.map(
+            lambda idx: tf.py_function(load_pair, [idx], [tf.string, tf.float32, tf.float32]),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+        dataset = dataset.map(lambda name, input_image, real_image: (
+            tf.ensure_shape(name, []),
+            tf.ensure_shape(input_image, image_shape),
+            tf.ensure_shape(real_image, image_shape),
+        ))
+        dataset = dataset.batch(self.batch_size)
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
         return dataset
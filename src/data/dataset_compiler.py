@@ -0,0 +1,280 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import tensorflow as tf
+
+from utils.image_processor import ImageProcessor
+from data.shard_store import ShardStore, ShardStoreWriter
+
+class DatasetCompiler:
+    """
+    DatasetCompiler class for compiling the image pairs of a DataLoader into a sharded, pre-decoded dataset.
+
+    The FITS files are decoded once and stored as native float32 data, so training and evaluation
+    runs can stream the shards without parsing FITS files. Two formats are supported:
+    - "tfrecord": TFRecord shards holding one record per pair.
+    - "npy": .npy shards holding each image once, which can be memory-mapped (see data.shard_store).
+
+    The compiled dataset is stored in a directory
+    named after a key derived from the checksums of the source files, so it is rebuilt whenever one of
+    the source files or the pairs change. The manifest records the size, modification time and checksum
+    of each source file, so only the files whose size or modification time changed are hashed again.
+    """
+
+    MANIFEST_NAME = ShardStore.MANIFEST_NAME
+    VERSION       = ShardStore.VERSION
+    FORMATS       = ("tfrecord", "npy")
+
+    # Upper bound on the images buffered per .npy shard, which bounds the memory used while compiling
+    MAX_IMAGES_PER_SHARD = 256
+
+    def __init__(self, data_loader, cache_dir, num_shards=8, data_format="tfrecord"):
+        """
+        Initializes the DatasetCompiler with the data loader, cache directory and number of shards.
+
+        Args:
+        - data_loader (DataLoader): An instance of the DataLoader class listing the image pairs.
+        - cache_dir (str): Directory in which compiled datasets are stored.
+        - num_shards (int, optional): Number of shards to write. Defaults to 8.
+        - data_format (str, optional): Format of the shards, either "tfrecord" or "npy". Defaults to "tfrecord".
+        """
+        if data_format not in self.FORMATS:
+            print(50*"-")
+            print(f"Unknown dataset format: {data_format}. Expected one of {self.FORMATS}.")
+            raise ValueError
+
+        self.data_loader = data_loader
+        self.cache_dir   = cache_dir
+        self.num_shards  = num_shards
+        self.data_format = data_format
+
+    @staticmethod
+    def file_checksum(file_path, chunk_size=1 << 20):
+        """
+        Computes the SHA-256 checksum of a file.
+
+        Args:
+        - file_path (str): Path to the file.
+        - chunk_size (int, optional): Number of bytes read at a time. Defaults to 1 MiB.
+
+        Returns:
+        - str: Hexadecimal checksum of the file.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def load_known_sources(self):
+        """
+        Collects the size, modification time and checksum of the source files recorded in the manifests of
+        the datasets compiled in the cache directory.
+
+        Returns:
+        - dict: Mapping from the absolute path of each source file to its [size, mtime_ns, checksum].
+        """
+        known = {}
+        if not os.path.isdir(self.cache_dir):
+            return known
+        for entry in os.listdir(self.cache_dir):
+            manifest_path = os.path.join(self.cache_dir, entry, self.MANIFEST_NAME)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, "r") as file:
+                    sources = json.load(file).get("sources", {})
+                # Manifests of older versions only hold the checksums, keyed by file name
+                known.update({path: source for path, source in sources.items() if isinstance(source, list)})
+        return known
+
+    def compute_key(self):
+        """
+        Computes the cache key of the dataset from the pairs and the checksums of the source files.
+        Only the files whose size or modification time differs from the manifests of the cache are hashed.
+
+        Returns:
+        - tuple: The cache key and a dictionary mapping the absolute path of each source file to its [size, mtime_ns, checksum].
+        """
+        input_names, input_paths, real_paths = self.data_loader.get_file_paths()
+        known   = self.load_known_sources()
+        sources = {}
+        for path in sorted(set(input_paths + real_paths)):
+            stat   = os.stat(path)
+            source = known.get(os.path.abspath(path))
+            if source is None or source[:2] != [stat.st_size, stat.st_mtime_ns]:
+                source = [stat.st_size, stat.st_mtime_ns, self.file_checksum(path)]
+            sources[path] = source
+
+        description = {
+            "version"    : self.VERSION,
+            "format"     : self.data_format,
+            "num_shards" : self.num_shards,
+            # Sorted, so the key does not depend on the order of the pairs in the CSV file
+            "pairs"      : sorted(zip(input_names, [sources[path][2] for path in input_paths], [sources[path][2] for path in real_paths])),
+        }
+        key = hashlib.sha256(json.dumps(description).encode("utf-8")).hexdigest()
+        return key, {os.path.abspath(path): source for path, source in sources.items()}
+
+    @staticmethod
+    def load_manifest(compiled_dir):
+        """
+        Loads the manifest of a compiled dataset.
+
+        Args:
+        - compiled_dir (str): Directory of the compiled dataset.
+
+        Returns:
+        - dict: The manifest of the compiled dataset.
+        """
+        with open(os.path.join(compiled_dir, DatasetCompiler.MANIFEST_NAME), "r") as file:
+            return json.load(file)
+
+    @staticmethod
+    def _bytes_feature(value):
+        return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+    @staticmethod
+    def _int64_feature(values):
+        return tf.train.Feature(int64_list=tf.train.Int64List(value=list(values)))
+
+    def _serialize_pair(self, input_name, input_path, real_path):
+        """
+        Decodes a pair of FITS files and serializes them into a tf.train.Example.
+
+        Args:
+        - input_name (str): Name of the input image.
+        - input_path (str): Path to the input FITS file.
+        - real_path (str): Path to the real FITS file.
+
+        Returns:
+        - tuple: The serialized example and the shape of the images.
+        """
+        input_image = np.ascontiguousarray(ImageProcessor.read_fits(input_path), dtype="<f4")
+        real_image  = np.ascontiguousarray(ImageProcessor.read_fits(real_path), dtype="<f4")
+        if input_image.shape != real_image.shape:
+            print(50*"-")
+            print(f"Error: Shape mismatch between {input_path} {input_image.shape} and {real_path} {real_image.shape}")
+            raise ValueError
+
+        example = tf.train.Example(features=tf.train.Features(feature={
+            "name"   : self._bytes_feature(input_name.encode("utf-8")),
+            "input"  : self._bytes_feature(input_image.tobytes()),
+            "target" : self._bytes_feature(real_image.tobytes()),
+            "shape"  : self._int64_feature(input_image.shape),
+        }))
+        return example.SerializeToString(), input_image.shape
+
+    def _write_tfrecord_shards(self, output_dir):
+        """
+        Writes one record per pair into TFRecord shards.
+
+        Args:
+        - output_dir (str): Directory in which the shards are written.
+
+        Returns:
+        - dict: Manifest entries describing the shards.
+        """
+        input_names, input_paths, real_paths = self.data_loader.get_file_paths()
+        num_shards  = max(1, min(self.num_shards, len(input_names)))
+        shard_names = [f"shard-{i:05d}-of-{num_shards:05d}.tfrecord" for i in range(num_shards)]
+        writers     = [tf.io.TFRecordWriter(os.path.join(output_dir, name)) for name in shard_names]
+
+        image_shape = None
+        try:
+            for idx, pair in enumerate(zip(input_names, input_paths, real_paths)):
+                record, image_shape = self._serialize_pair(*pair)
+                writers[idx % num_shards].write(record)
+        finally:
+            for writer in writers:
+                writer.close()
+
+        return {
+            "num_pairs"   : len(input_names),
+            "image_shape" : list(image_shape) if image_shape else None,
+            "shards"      : shard_names,
+        }
+
+    def _write_npy_shards(self, output_dir):
+        """
+        Writes each image once into native float32 .npy shards, along with the list of pairs.
+        The byte order of the FITS data is converted here, once, instead of on every read.
+
+        Args:
+        - output_dir (str): Directory in which the shards are written.
+
+        Returns:
+        - dict: Manifest entries describing the shards, the location of each image and the pairs.
+        """
+        input_names, input_paths, real_paths = self.data_loader.get_file_paths()
+        file_paths       = sorted(set(input_paths + real_paths))
+        images_per_shard = -(-len(file_paths) // max(1, self.num_shards))
+        writer           = ShardStoreWriter(output_dir, min(max(1, images_per_shard), self.MAX_IMAGES_PER_SHARD))
+        for file_path in file_paths:
+            writer.add(os.path.basename(file_path), ImageProcessor.read_fits(file_path))
+
+        pairs = [
+            [input_name, os.path.basename(input_path), os.path.basename(real_path)]
+            for input_name, input_path, real_path in zip(input_names, input_paths, real_paths)
+        ]
+        return {"num_pairs": len(pairs), "pairs": pairs, **writer.close()}
+
+    def _update_sources(self, compiled_dir, sources):
+        """
+        Records the current size and modification time of the source files in the manifest of a compiled dataset,
+        if files were touched without changing their contents, so they are not hashed again by the next run.
+
+        Args:
+        - compiled_dir (str): Directory of the compiled dataset.
+        - sources (dict): The [size, mtime_ns, checksum] of each source file, as returned by compute_key.
+        """
+        manifest = self.load_manifest(compiled_dir)
+        if manifest.get("sources") == sources:
+            return
+
+        manifest["sources"] = sources
+        temp_path = os.path.join(compiled_dir, self.MANIFEST_NAME + ".tmp")
+        with open(temp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(temp_path, os.path.join(compiled_dir, self.MANIFEST_NAME))
+
+    def compile(self):
+        """
+        Compiles the dataset into shards, unless an up-to-date compiled dataset already exists.
+
+        Returns:
+        - str: Directory of the compiled dataset.
+        """
+        key, sources = self.compute_key()
+        compiled_dir = os.path.join(self.cache_dir, key)
+        if os.path.exists(os.path.join(compiled_dir, self.MANIFEST_NAME)):
+            self._update_sources(compiled_dir, sources)
+            print(f"Using compiled dataset {compiled_dir}")
+            return compiled_dir
+
+        # Write into a temporary directory first so an interrupted compilation is never picked up
+        temp_dir = compiled_dir + ".tmp"
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        os.makedirs(temp_dir)
+
+        if self.data_format == "tfrecord":
+            contents = self._write_tfrecord_shards(temp_dir)
+        else:
+            contents = self._write_npy_shards(temp_dir)
+
+        manifest = {
+            "key"     : key,
+            "version" : self.VERSION,
+            "format"  : self.data_format,
+            "sources" : sources,
+            **contents,
+        }
+        with open(os.path.join(temp_dir, self.MANIFEST_NAME), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+        if os.path.exists(compiled_dir):
+            shutil.rmtree(compiled_dir)
+        os.replace(temp_dir, compiled_dir)
+        print(f"Compiled {manifest['num_pairs']} pairs into {len(manifest['shards'])} shards in {compiled_dir}")
+        return compiled_dir
@@ -0,0 +1,141 @@
+import tensorflow as tf
+
+class FITSDecoder:
+    """
+    FITSDecoder class for decoding FITS image files with native TensorFlow ops.
+
+    The decoder only relies on the mandatory, fixed-format keywords of the primary header
+    (SIMPLE, BITPIX, NAXIS, NAXIS1, NAXIS2, NAXIS3, END) and on BSCALE and BZERO, so it can run
+    inside a tf.data pipeline without a Python callback. It supports the files written by the
+    preprocessing scripts: a floating point (BITPIX -32 or -64), unscaled primary HDU holding a
+    (height, width, channels) cube. Any extension following the primary HDU is ignored.
+    """
+
+    # Length of a header card and of a FITS block in bytes
+    CARD_LENGTH     = 80
+    BLOCK_LENGTH    = 2880
+    CARDS_PER_BLOCK = BLOCK_LENGTH // CARD_LENGTH
+
+    @staticmethod
+    def _card_value(contents, card_index):
+        """
+        Reads the integer value of a fixed-format header card.
+
+        Args:
+        - contents (tf.Tensor): Scalar string tensor holding the raw file contents.
+        - card_index (int): Position of the card in the primary header.
+
+        Returns:
+        - tf.Tensor: The value of the card as an int64 scalar.
+        """
+        # Fixed-format values are right justified in columns 11 to 30
+        value = tf.strings.substr(contents, card_index * FITSDecoder.CARD_LENGTH + 10, 20)
+        return tf.strings.to_number(tf.strings.strip(value), out_type=tf.int64)
+
+    @staticmethod
+    def _header_length(contents):
+        """
+        Locates the END card of the primary header, searching the header one block at a time.
+
+        Args:
+        - contents (tf.Tensor): Scalar string tensor holding the raw file contents.
+
+        Returns:
+        - tuple: Index of the END card, and length of the primary header in bytes (the offset of the data unit).
+        """
+        length      = tf.strings.length(contents)
+        card_starts = tf.range(FITSDecoder.CARDS_PER_BLOCK) * FITSDecoder.CARD_LENGTH
+
+        def search_block(block, end_card):
+            # The keyword of a card fills its first 8 bytes, padded with spaces
+            keywords = tf.strings.substr(contents, block * FITSDecoder.BLOCK_LENGTH + card_starts, tf.fill(tf.shape(card_starts), 8))
+            matches  = tf.where(tf.equal(keywords, "END     "))[:, 0]
+            end_card = tf.cond(
+                tf.size(matches) > 0,
+                lambda: block * FITSDecoder.CARDS_PER_BLOCK + tf.cast(matches[0], tf.int32),
+                lambda: end_card,
+            )
+            return block + 1, end_card
+
+        num_blocks, end_card = tf.while_loop(
+            lambda block, end_card: tf.logical_and(end_card < 0, block * FITSDecoder.BLOCK_LENGTH < length),
+            search_block,
+            (tf.constant(0), tf.constant(-1)),
+        )
+        tf.debugging.assert_non_negative(end_card, message="FITS header has no END card")
+        return end_card, num_blocks * FITSDecoder.BLOCK_LENGTH
+
+    @staticmethod
+    def _assert_unscaled(contents, num_cards):
+        """
+        Asserts that BSCALE and BZERO are absent from the header or set to their identity values, as the data
+        is returned as stored.
+
+        Args:
+        - contents (tf.Tensor): Scalar string tensor holding the raw file contents.
+        - num_cards (tf.Tensor): Number of header cards before the END card.
+        """
+        card_starts = tf.range(num_cards) * FITSDecoder.CARD_LENGTH
+        keywords    = tf.strings.substr(contents, card_starts, tf.fill(tf.shape(card_starts), 8))
+        values      = tf.strings.substr(contents, card_starts + 10, tf.fill(tf.shape(card_starts), FITSDecoder.CARD_LENGTH - 10))
+        values      = tf.strings.strip(tf.strings.regex_replace(values, "/.*", ""))
+
+        bscale = tf.strings.to_number(tf.boolean_mask(values, tf.equal(keywords, "BSCALE  ")), out_type=tf.float64)
+        bzero  = tf.strings.to_number(tf.boolean_mask(values, tf.equal(keywords, "BZERO   ")), out_type=tf.float64)
+        tf.debugging.Assert(tf.reduce_all(tf.equal(bscale, 1.0)), ["Unsupported BSCALE:", bscale])
+        tf.debugging.Assert(tf.reduce_all(tf.equal(bzero, 0.0)), ["Unsupported BZERO:", bzero])
+
+    @staticmethod
+    def decode(contents, image_shape=(256, 256, 3)):
+        """
+        Decodes the raw contents of a FITS file into a float32 image tensor.
+
+        Args:
+        - contents (tf.Tensor): Scalar string tensor holding the raw file contents.
+        - image_shape (tuple, optional): Static shape of the decoded image. Defaults to (256, 256, 3).
+
+        Returns:
+        - tf.Tensor: Tensor of shape (height, width, channels) and dtype float32.
+
+        Note:
+        - The data unit starts at the first block boundary after the END card of the primary header.
+        """
+        tf.debugging.Assert(tf.equal(tf.strings.substr(contents, 0, 8), "SIMPLE  "), ["Not a FITS file"])
+        bitpix = FITSDecoder._card_value(contents, 1)
+        naxis  = FITSDecoder._card_value(contents, 2)
+        tf.debugging.assert_equal(naxis, tf.constant(3, tf.int64), message="FITS data must be a 3D cube")
+        tf.debugging.Assert(tf.logical_or(tf.equal(bitpix, -32), tf.equal(bitpix, -64)), ["Unsupported BITPIX:", bitpix])
+
+        # FITS axes are stored in reverse order of the numpy (height, width, channels) layout
+        channels = FITSDecoder._card_value(contents, 3)
+        width    = FITSDecoder._card_value(contents, 4)
+        height   = FITSDecoder._card_value(contents, 5)
+
+        end_card, offset = FITSDecoder._header_length(contents)
+        FITSDecoder._assert_unscaled(contents, end_card)
+
+        num_bytes = tf.cast(height * width * channels * (tf.abs(bitpix) // 8), tf.int32)
+        tf.debugging.assert_less_equal(offset + num_bytes, tf.strings.length(contents), message="FITS data unit is truncated")
+        raw = tf.strings.substr(contents, offset, num_bytes)
+
+        data = tf.cond(
+            tf.equal(bitpix, -64),
+            lambda: tf.cast(tf.io.decode_raw(raw, tf.float64, little_endian=False), tf.float32),
+            lambda: tf.io.decode_raw(raw, tf.float32, little_endian=False),
+        )
+        data = tf.reshape(data, tf.stack([height, width, channels]))
+        return tf.ensure_shape(data, image_shape)
+
+    @staticmethod
+    def read(file_path, image_shape=(256, 256, 3)):
+        """
+        Reads and decodes a FITS file.
+
+        Args:
+        - file_path (tf.Tensor): Scalar string tensor holding the path to the FITS file.
+        - image_shape (tuple, optional): Static shape of the decoded image. Defaults to (256, 256, 3).
+
+        Returns:
+        - tf.Tensor: Tensor of shape (height, width, channels) and dtype float32.
+        """
+        return FITSDecoder.decode(tf.io.read_file(file_path), image_shape)
@@ -0,0 +1,142 @@
+import os
+import numpy as np
+
+class ShardStoreWriter:
+    """
+    ShardStoreWriter class for writing images into a sharded store of native float32 .npy files.
+
+    Each shard holds a stack of images of shape (n, height, width, channels), so the images can be
+    memory-mapped and handed to TensorFlow without decoding or byte swapping.
+    """
+
+    def __init__(self, directory, images_per_shard=64):
+        """
+        Initializes the ShardStoreWriter with the output directory and the shard size.
+
+        Args:
+        - directory (str): Directory in which the shards are written.
+        - images_per_shard (int, optional): Number of images per shard. Defaults to 64.
+        """
+        self.directory        = directory
+        self.images_per_shard = images_per_shard
+        self.image_shape      = None
+        self.shards           = []
+        self.files            = {}
+        self._names           = []
+        self._images          = []
+
+    def add(self, name, image):
+        """
+        Adds an image to the store. Images are buffered and written once a shard is full.
+
+        Args:
+        - name (str): Name of the image.
+        - image (numpy.ndarray): Image of shape (height, width, channels).
+        """
+        image = np.asarray(image, dtype="<f4")
+        if self.image_shape is None:
+            self.image_shape = image.shape
+        elif image.shape != self.image_shape:
+            print(50*"-")
+            print(f"Error: Image {name} has shape {image.shape}, expected {self.image_shape}")
+            raise ValueError
+
+        self._names.append(name)
+        self._images.append(image)
+        if len(self._images) == self.images_per_shard:
+            self._flush()
+
+    def _flush(self):
+        """
+        Writes the buffered images into a new shard.
+        """
+        if not self._images:
+            return
+
+        shard_name = f"shard-{len(self.shards):05d}.npy"
+        shard      = np.lib.format.open_memmap(
+            os.path.join(self.directory, shard_name),
+            mode  = "w+",
+            dtype = "<f4",
+            shape = (len(self._images),) + self.image_shape,
+        )
+        for row, (name, image) in enumerate(zip(self._names, self._images)):
+            shard[row]       = image
+            self.files[name] = [len(self.shards), row]
+        shard.flush()
+        del shard
+
+        self.shards.append(shard_name)
+        self._names  = []
+        self._images = []
+
+    def close(self):
+        """
+        Writes the remaining buffered images and returns the index of the store.
+
+        Returns:
+        - dict: The shard file names, the (shard, row) location of each image and the image shape.
+        """
+        self._flush()
+        return {
+            "shards"      : self.shards,
+            "files"       : self.files,
+            "image_shape" : list(self.image_shape) if self.image_shape else None,
+        }
+
+class ShardStore:
+    """
+    ShardStore class for reading images from a store written by the ShardStoreWriter.
+    Shards are memory-mapped on first access and images are returned as views of the mapping.
+
+    The module only depends on numpy, so the preprocessing scripts can write stores without importing TensorFlow.
+    """
+
+    # Names of the files describing a store, and version of its manifest
+    MANIFEST_NAME      = "manifest.json"
+    STORE_POINTER_NAME = "store.json"
+    VERSION            = 1
+
+    def __init__(self, directory, index):
+        """
+        Initializes the ShardStore with the store directory and its index.
+
+        Args:
+        - directory (str): Directory containing the shards.
+        - index (dict): Index of the store, as returned by ShardStoreWriter.close.
+        """
+        self.directory   = directory
+        self.shard_names = index["shards"]
+        self.files       = index["files"]
+        self.image_shape = index["image_shape"]
+        self._shards     = [None] * len(self.shard_names)
+
+    def get(self, name):
+        """
+        Retrieves an image from the store.
+
+        Args:
+        - name (str): Name of the image.
+
+        Returns:
+        - numpy.ndarray: A view of the image in the memory-mapped shard.
+        """
+        shard_idx, row = self.files[name]
+        if self._shards[shard_idx] is None:
+            # Copy-on-write mapping: pages are shared with the page cache and never written back
+            self._shards[shard_idx] = np.load(os.path.join(self.directory, self.shard_names[shard_idx]), mmap_mode="c")
+        return self._shards[shard_idx][row]
+
+    def get_tensor(self, name):
+        """
+        Retrieves an image from the store as a tensor backed by the memory-mapped shard.
+
+        Args:
+        - name (str): Name of the image.
+
+        Returns:
+        - tf.Tensor: Tensor sharing memory with the memory-mapped shard.
+        """
+        # Imported here, as it imports TensorFlow
+        from utils.image_processor import ImageProcessor
+        return ImageProcessor.as_tensor(self.get(name))
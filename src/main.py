@@ -1,6 +1,10 @@
+from managers.export_manager import ExportManager
 from managers.train_manager import TrainingManager
+from managers.dataset_manager import DatasetManager
+from managers.rollout_manager import RolloutManager
 from managers.user_input_manager import UserInputManager
 from managers.evaluation_manager import EvaluationManager
+from managers.prediction_manager import PredictionManager
 
 class App:
     """
@@ -17,7 +21,7 @@ class App:
         """
         Main method to execute the application's primary logic.
         
-        This method retrieves the user's desired action (training or evaluation)
+        This method retrieves the user's desired action (training, evaluation, dataset compilation, export, prediction or rollout)
         and then invokes the appropriate manager to handle the selected action.
         """
         action = UserInputManager.get_action()
@@ -28,6 +32,18 @@ class App:
         elif action == "e":
             evaluator_manager = EvaluationManager()
             evaluator_manager.orchestrate_evaluation()
+        elif action == "c":
+            dataset_manager = DatasetManager()
+            dataset_manager.orchestrate_compilation()
+        elif action == "x":
+            export_manager = ExportManager()
+            export_manager.orchestrate_export()
+        elif action == "p":
+            prediction_manager = PredictionManager()
+            prediction_manager.orchestrate_prediction()
+        elif action == "r":
+            rollout_manager = RolloutManager()
+            rollout_manager.orchestrate_rollout()
 
 if __name__ == "__main__":
     application = App()
@@ -0,0 +1,50 @@
+import os
+import traceback
+
+from data.dataset_compiler import DatasetCompiler
+from managers.model_manager import ModelManager
+
+class DatasetManager(ModelManager):
+    """
+    The DatasetManager class is responsible for compiling datasets into the sharded cache
+    streamed by the "tfrecord" and "memmap" input pipelines.
+    It inherits from the ModelManager class.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the DatasetManager class.
+        """
+        super().__init__(*args, **kwargs)
+
+    def compile_dataset(self, csv_path):
+        """
+        Compiles the pairs listed in the given CSV file into the cache directory.
+
+        Args:
+            csv_path (str): Path to the CSV file containing image pairs.
+
+        Returns:
+            str: Directory of the compiled dataset, or of the dataset store holding the pairs.
+        """
+        hyperparameters = self.config["hyperparameters"]
+        data_loader     = self.create_data_loader(csv_path)
+        if data_loader.store_dir is not None:
+            print(f"The pairs are already stored in the dataset store {data_loader.store_dir}, which is read without compilation.")
+            return data_loader.store_dir
+
+        data_format = "npy" if hyperparameters["PIPELINE"] == "memmap" else "tfrecord"
+        compiler    = DatasetCompiler(data_loader, hyperparameters["CACHE_DIR"], hyperparameters["NUM_SHARDS"], data_format)
+        return compiler.compile()
+
+    def orchestrate_compilation(self):
+        """
+        Orchestrates the compilation of a dataset, including prompting the user for the data directory.
+        """
+        try:
+            data_dir = self.get_data_directory("dataset")
+            self.compile_dataset(os.path.join(data_dir, "pairs.csv"))
+
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            traceback.print_exc()
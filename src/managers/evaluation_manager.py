@@ -1,13 +1,15 @@
 import os
+import time
+import heapq
 import datetime
 import traceback
 import tensorflow as tf
 
 from astropy.io import fits
-from data.dataset import Dataset
-from pix2pix.train import Trainer
+from prettytable import PrettyTable
 from utils.pdf_writer import PDFWriter
-from data.data_loader import DataLoader
+from utils.writer_pool import WriterPool
+from utils.metrics import EvaluationMetrics
 from managers.file_manager import FileManager
 from managers.model_manager import ModelManager
 from utils.image_processor import ImageProcessor
@@ -55,13 +57,16 @@ class EvaluationManager(ModelManager):
         folder_name     = f"{timestamp}_{checkpoint_name}"
         return os.path.join(self.get_default_evaluation_path(checkpoint_path), folder_name), timestamp
 
-    def save_evaluation_results(self, final_save_path, mse_values):
+    def save_evaluation_results(self, final_save_path, mse_values, metrics=None):
         """
         Save the MSE values of the evaluation to a CSV file.
+        If metrics are given, their summary is saved to METRICS_SUMMARY.CSV. The metrics of each file are written to
+        METRICS.CSV during the evaluation (see evaluate_model).
         
         Args:
             final_save_path (str): Path to save the evaluation results.
             mse_values (dict): Dictionary containing file names as keys and their corresponding MSE values as values.
+            metrics (EvaluationMetrics, optional): Metrics computed during the evaluation. Defaults to None.
         """
         os.makedirs(final_save_path, exist_ok=True)
         mse_file_path = os.path.join(final_save_path, "MSE.CSV")
@@ -70,69 +75,153 @@ class EvaluationManager(ModelManager):
                 file.write(f"{filename},{mse}\n")
         print(f"Evaluation results saved to {mse_file_path}")
 
+        if metrics is None:
+            return
 
-    def evaluate_model(self, test_csv_path, checkpoint_path, save_images_path):
+        summary_file_path = os.path.join(final_save_path, "METRICS_SUMMARY.CSV")
+        with open(summary_file_path, "w") as file:
+            summary = metrics.summary()
+            columns = list(next(iter(summary.values())).keys())
+            file.write(",".join(["metric"] + columns) + "\n")
+            for name, values in summary.items():
+                file.write(",".join([name] + [str(values[column]) for column in columns]) + "\n")
+        print(f"Evaluation metrics summary saved to {summary_file_path}")
+
+
+    @staticmethod
+    def save_prediction(file_name, input, target, prediction, save_images_path):
+        """
+        Save the prediction for a test file as a FITS file, along with its collage.
+
+        Args:
+            file_name (str): Name of the test file.
+            input (numpy.ndarray): Input image, of shape (1, height, width, channels).
+            target (numpy.ndarray): Target image, of shape (1, height, width, channels).
+            prediction (numpy.ndarray): Predicted image, of shape (1, height, width, channels).
+            save_images_path (str): Path to save the generated images.
+        """
+        fits_path = os.path.join(save_images_path, f"{file_name}_predicted.fits")
+        fits.writeto(fits_path, prediction[0], overwrite=True)
+
+        ImageProcessor().generate_images(None, input, target, file_name, save_images_path, mode='eval', prediction=prediction)
+
+    @staticmethod
+    def print_stage_times(wall_time, read_time, inference_time, writer_pool):
+        """
+        Print the time spent in each stage of the evaluation.
+
+        Args:
+            wall_time (float): Total time of the evaluation loop, in seconds.
+            read_time (float): Time spent waiting for test batches, in seconds.
+            inference_time (float): Time spent running the generator and computing the metrics, in seconds.
+            writer_pool (WriterPool): Pool that wrote the generated images.
+        """
+        table = PrettyTable()
+        table.field_names = ["Stage", "Time"]
+        table.add_row(["Waiting for test data", f"{read_time:.2f} sec"])
+        table.add_row(["Inference and metrics", f"{inference_time:.2f} sec"])
+        table.add_row([f"Writing images ({writer_pool.tasks} files, summed over threads)", f"{writer_pool.busy_time:.2f} sec"])
+        table.add_row(["Waiting for writers", f"{writer_pool.wait_time:.2f} sec"])
+        table.add_row(["Total", f"{wall_time:.2f} sec"])
+        print(table)
+
+    def evaluate_model(self, test_csv_path, checkpoint_path, save_images_path, metrics_path=None):
         """
         Evaluate the trained model using test data and calculate the MSE for each test file.
         
         Args:
             test_csv_path (str): Path to the test data CSV file.
-            checkpoint_path (str): Path to the model checkpoint.
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
             save_images_path (str): Path to save the generated images.
+            metrics_path (str, optional): Path of a CSV file to which the metrics of each file are written as the batches
+                                          are evaluated, so they are not kept in memory. Defaults to None.
         
         Returns:
-            tuple: Tuple containing a dictionary of MSE values and a list of image paths.
+            tuple: Tuple containing a dictionary of MSE values, a list of image paths and the EvaluationMetrics of the test data.
         """
-        # Ensure the checkpoint file exists
-        if not os.path.exists(checkpoint_path + ".index"):
-            print(50*"-")
-            print(f"Checkpoint file {checkpoint_path}.index does not exist.")
-            raise ValueError
-        
-        test_data_loader = DataLoader(test_csv_path, test_csv_path)
-        test_dataset     = Dataset(test_data_loader, self.config["hyperparameters"]["BUFFER_SIZE"], self.config["hyperparameters"]["BATCH_SIZE"]).create_dataset()
+        test_data_loader = self.create_data_loader(test_csv_path)
+        test_dataset     = self.create_dataset(test_data_loader)
 
-        generator, discriminator = self.create_and_build_models()
-       
-        trainer = Trainer(generator, discriminator, None, None)
-        status  = trainer.checkpoint.restore(checkpoint_path)
-        status.expect_partial()
+        predict = self.load_generator(checkpoint_path)
 
         mse_values = {}
         images     = []  # To store the paths of the top 3 and worst MSE images
-        for idx, (file_name, input, target) in enumerate(test_dataset):
-            prediction                                       = generator.model(input, training=True)
-            mse_loss                                         = tf.keras.losses.MeanSquaredError()(target, prediction)
-            mse_values[file_name.numpy()[0].decode('utf-8')] = mse_loss.numpy()
-            print(f"MSE for test file {file_name.numpy()[0].decode('utf-8')}: {mse_loss.numpy()}")
-
-            # Save generated images if path is provided
-            if save_images_path:
-                taget_name      = file_name.numpy()[0].decode('utf-8')
-                image_name = f"{taget_name}_predicted.fits"
-                fits_path       = os.path.join(save_images_path, image_name)
-                prediction_np   = prediction[0].numpy()
-                fits.writeto(fits_path, prediction_np, overwrite=True)
-
-                ImageProcessor().generate_images(generator, input, target, taget_name, save_images_path, mode='eval')
+        metrics    = EvaluationMetrics()
+
+        # Each test sample is read and inferred once. Only the samples shown in the PDF report are
+        # kept in memory: a max-heap of the 3 lowest MSE samples and the highest MSE sample.
+        top_3_samples = []
+        worst_sample  = None
+
+        # Batches are prefetched while the current batch is inferred, and the outputs are written by a
+        # pool of threads, so reading, inference and writing overlap
+        read_time      = 0.0
+        inference_time = 0.0
+        start_time     = time.time()
+        test_iterator  = iter(test_dataset.prefetch(tf.data.AUTOTUNE))
+        metrics_file = None
+        if metrics_path:
+            os.makedirs(os.path.dirname(metrics_path), exist_ok=True)
+            metrics_file = open(metrics_path, "w")
+            metrics_file.write(",".join(("file_name",) + metrics.METRIC_NAMES) + "\n")
+
+        with WriterPool(self.config["hyperparameters"]["EVAL_WRITER_THREADS"]) as writer_pool:
+            while True:
+                start = time.time()
+                batch = next(test_iterator, None)
+                read_time += time.time() - start
+                if batch is None:
+                    break
+
+                start                    = time.time()
+                file_names, input, target = batch
+                prediction               = predict(input)
+                file_names               = [file_name.decode('utf-8') for file_name in file_names.numpy()]
+
+                # Per-sample metrics of the batch; the MSE is averaged over the pixels and channels of each image
+                batch_metrics  = metrics.update(target, prediction)
+                mse_losses     = batch_metrics["mse"]
+                input          = input.numpy()
+                target         = target.numpy()
+                prediction     = prediction.numpy()
+                inference_time += time.time() - start
+
+                for idx, file_name in enumerate(file_names):
+                    mse_values[file_name] = mse_losses[idx]
+                    if metrics_file is not None:
+                        metrics_file.write(",".join([file_name] + [str(batch_metrics[name][idx]) for name in metrics.METRIC_NAMES]) + "\n")
+                    print(f"MSE for test file {file_name}: {mse_losses[idx]}")
+
+                    sample = (file_name, input[idx:idx + 1], target[idx:idx + 1], prediction[idx:idx + 1])
+                    order  = len(mse_values)  # Breaks ties in favour of the first file, like a stable sort
+                    if len(top_3_samples) < 3:
+                        heapq.heappush(top_3_samples, (-mse_losses[idx], -order, sample))
+                    elif mse_losses[idx] < -top_3_samples[0][0]:
+                        heapq.heapreplace(top_3_samples, (-mse_losses[idx], -order, sample))
+                    if worst_sample is None or mse_losses[idx] >= worst_sample[0]:
+                        worst_sample = (mse_losses[idx], sample)
+
+                    # Save generated images if path is provided
+                    if save_images_path:
+                        writer_pool.submit(self.save_prediction, *sample, save_images_path)
+
+        if metrics_file is not None:
+            metrics_file.close()
+            print(f"Evaluation metrics of each file saved to {metrics_path}")
+        self.print_stage_times(time.time() - start_time, read_time, inference_time, writer_pool)
 
         # Create temp folder to store images for PDF report
         os.makedirs("temp", exist_ok=True)
-        
-        # Identify top 3 and worst MSE files
-        sorted_mse_items = sorted(mse_values.items(), key=lambda x: x[1])
-        top_3_files      = sorted_mse_items[:3]
-        worst_file       = sorted_mse_items[-1]
-
-        # Generate images for these files to be used in the PDF report
-        for rank, (file_name, mse) in enumerate(top_3_files + [worst_file]):
-            _, input, target = next(filter(lambda x: x[0].numpy()[0].decode('utf-8') == file_name, test_dataset))
-            image_path       = ImageProcessor().generate_images(generator, input, target, file_name, "temp", mode='eval')
+
+        # Generate images for the top 3 and worst MSE files from the retained predictions
+        top_3_files = [sample for _, _, sample in sorted(top_3_samples, reverse=True)]
+        for rank, (file_name, input, target, prediction) in enumerate(top_3_files + [worst_sample[1]]):
+            image_path = ImageProcessor().generate_images(None, input, target, file_name, "temp", mode='eval', prediction=prediction)
             images.append((rank, image_path))
 
         avg_mse = sum(mse_values.values()) / len(mse_values)
         print(f"Average MSE on test data: {avg_mse}")
-        return mse_values, images  
+        return mse_values, images, metrics
 
 
     def orchestrate_evaluation(self):
@@ -141,7 +230,7 @@ class EvaluationManager(ModelManager):
         evaluating the model, and saving the results.
         """
         try:
-            checkpoint_path = self.prompt_for_checkpoint()
+            checkpoint_path = self.prompt_for_checkpoint(include_exported=True)
             test_path       = self.get_data_directory("testing")
             test_csv_path   = os.path.join(test_path, "pairs.csv")
             if not os.path.exists(test_csv_path):
@@ -160,10 +249,11 @@ class EvaluationManager(ModelManager):
 
             FileManager.copy_data_to_folder(test_path, os.path.join(final_save_path, "data", "test"))    
 
-            mse_values, images = self.evaluate_model(test_csv_path, checkpoint_path, save_images_path)
-            self.save_evaluation_results(final_save_path, mse_values)
+            metrics_path                = os.path.join(final_save_path, "METRICS.CSV")
+            mse_values, images, metrics = self.evaluate_model(test_csv_path, checkpoint_path, save_images_path, metrics_path)
+            self.save_evaluation_results(final_save_path, mse_values, metrics)
 
-            PDFWriter.generate_pdf_report(checkpoint_path, timestamp, mse_values, final_save_path, images)
+            PDFWriter.generate_pdf_report(checkpoint_path, timestamp, mse_values, final_save_path, images, metrics)
 
         except Exception as e:
             print("-" * 50)
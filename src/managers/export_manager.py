@@ -0,0 +1,103 @@
+import os
+import traceback
+
+from managers.model_manager import ModelManager
+from pix2pix.inference import InferenceGenerator
+from pix2pix.quantization import GeneratorQuantizer
+from managers.user_input_manager import UserInputManager
+
+class ExportManager(ModelManager):
+    """
+    The ExportManager class is responsible for exporting the generator of a training checkpoint as a
+    SavedModel, which evaluation can load without building the discriminator, the optimizers and the Trainer,
+    and for quantizing it to TensorFlow Lite models for CPU inference.
+    It inherits from the ModelManager class.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the ExportManager class.
+        """
+        super().__init__(*args, **kwargs)
+
+    def get_export_path(self, checkpoint_path):
+        """
+        Get the path of the exported generator based on the checkpoint path.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint.
+
+        Returns:
+            str: Path of the exported generator, in the exported_models folder of the experiment.
+        """
+        base_dir = os.path.dirname(os.path.dirname(checkpoint_path))
+        return os.path.join(base_dir, self.EXPORT_DIR_NAME, os.path.basename(checkpoint_path))
+
+    def get_quantized_path(self, checkpoint_path):
+        """
+        Get the path of the quantized generators based on the checkpoint path.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint.
+
+        Returns:
+            str: Path of the quantized generators, next to the exported generator.
+        """
+        return self.get_export_path(checkpoint_path) + "_tflite"
+
+    def export_generator(self, checkpoint_path, export_dir):
+        """
+        Restores the generator of a training checkpoint and exports its inference version (see pix2pix.inference).
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint.
+            export_dir (str): Directory in which the SavedModel is written.
+        """
+        generator = self.restore_generator(checkpoint_path, self.config["hyperparameters"]["VARIABLE_RESOLUTION"])
+        InferenceGenerator(generator).export(export_dir, self.config["hyperparameters"]["EXPORT_BATCH_SIZES"])
+        print(f"Generator exported to {export_dir}")
+
+    def quantize_generator(self, checkpoint_path, quantized_dir, calibration_csv_path, test_csv_path):
+        """
+        Restores the generator of a training checkpoint, converts it to a TensorFlow Lite model for each mode in
+        QUANTIZATION_MODES, and compares the models with the float generator on the test data.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint.
+            quantized_dir (str): Directory in which the TensorFlow Lite models are written.
+            calibration_csv_path (str): Path to the CSV file of the pairs whose input images calibrate the int8 mode.
+            test_csv_path (str): Path to the test data CSV file.
+
+        Returns:
+            dict: Size, latency and MSE of each model, as returned by GeneratorQuantizer.compare.
+        """
+        hyperparameters = self.config["hyperparameters"]
+        quantizer       = GeneratorQuantizer(self.restore_generator(checkpoint_path, self.config["hyperparameters"]["VARIABLE_RESOLUTION"]))
+
+        calibration_dataset = self.create_dataset(self.create_data_loader(calibration_csv_path), shuffle=True)
+        calibration_images  = [
+            input_image.numpy()
+            for _, input_image, _ in calibration_dataset.unbatch().take(hyperparameters["CALIBRATION_SAMPLES"])
+        ]
+        print(f"Calibrating with {len(calibration_images)} input images")
+
+        model_paths  = quantizer.quantize(quantized_dir, calibration_images, hyperparameters["QUANTIZATION_MODES"])
+        test_dataset = self.create_dataset(self.create_data_loader(test_csv_path))
+        return quantizer.compare(model_paths, test_dataset)
+
+    def orchestrate_export(self):
+        """
+        Orchestrates the export of a generator, including prompting the user for the checkpoint.
+        """
+        try:
+            checkpoint_path = self.prompt_for_checkpoint()
+            self.export_generator(checkpoint_path, self.get_export_path(checkpoint_path))
+
+            if UserInputManager.query_yes_no("Do you want to quantize the generator for CPU inference?"):
+                calibration_csv_path = os.path.join(self.get_data_directory("calibration"), "pairs.csv")
+                test_csv_path        = os.path.join(self.get_data_directory("testing"), "pairs.csv")
+                self.quantize_generator(checkpoint_path, self.get_quantized_path(checkpoint_path), calibration_csv_path, test_csv_path)
+
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            traceback.print_exc()
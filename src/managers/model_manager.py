@@ -1,21 +1,26 @@
 import os
 import sys
 import yaml
+import tensorflow as tf
 
+from data.dataset import Dataset
+from data.data_loader import DataLoader
 from pix2pix.generator import Generator
 from managers.file_manager import FileManager
 from pix2pix.discriminator import Discriminator
 from managers.user_input_manager import UserInputManager
+from pix2pix.inference import InferenceGenerator, ExportedGenerator
 
 class ModelManager:
     """
     The ModelManager class manages the loading and handling of model configurations, 
     checkpoints, and data directories. It provides methods to load hyperparameters, 
     retrieve available checkpoints, and prompt users for checkpoint selection.
-    It is the parent class of the TrainingManager and EvaluationManager classes.
+    It is the parent class of the TrainingManager, EvaluationManager, DatasetManager, ExportManager, PredictionManager and RolloutManager classes.
     """
 
     EXPERIMENTS_DIR      = "./experiments"
+    EXPORT_DIR_NAME      = "exported_models"
     HYPERPARAMETERS_PATH = "config/hyperparameters.yaml"
 
     def __init__(self):
@@ -37,12 +42,15 @@ class ModelManager:
         with open(config_path, "r") as file:
             return yaml.safe_load(file)
 
-    def get_available_checkpoints(self):
+    def get_available_checkpoints(self, include_exported=False):
         """
         Retrieves a list of available checkpoints from the experiments directory.
 
+        Args:
+            include_exported (bool, optional): Whether to include the generators exported by the ExportManager. Defaults to False.
+
         Returns:
-            list: List of tuples containing experiment name and checkpoint filename.
+            list: List of tuples containing experiment name, checkpoint folder and checkpoint name.
         """
         checkpoints     = []
         for experiment in os.listdir(self.EXPERIMENTS_DIR):
@@ -50,35 +58,44 @@ class ModelManager:
             if os.path.exists(checkpoint_dir):
                 for f in os.listdir(checkpoint_dir):
                     if f.endswith(".index"):
-                        checkpoints.append((experiment, f))
+                        checkpoints.append((experiment, "training_checkpoints", f.replace('.index', '')))
+
+            export_dir = os.path.join(self.EXPERIMENTS_DIR, experiment, self.EXPORT_DIR_NAME)
+            if include_exported and os.path.exists(export_dir):
+                for f in os.listdir(export_dir):
+                    if ExportedGenerator.is_exported(os.path.join(export_dir, f)):
+                        checkpoints.append((experiment, self.EXPORT_DIR_NAME, f))
         return checkpoints
 
-    def prompt_for_checkpoint(self):
+    def prompt_for_checkpoint(self, include_exported=False):
         """
         Prompts the user to select a checkpoint either automatically from the experiments directory 
         or by manually providing a path.
 
+        Args:
+            include_exported (bool, optional): Whether exported generators can be selected as well. Defaults to False.
+
         Returns:
             str: Path to the selected checkpoint.
         """
         choice = UserInputManager.query_yes_no("Would you like the system to automatically search the experiments directory for all available checkpoints?")
         if choice:
-            available_checkpoints = self.get_available_checkpoints()
+            available_checkpoints = self.get_available_checkpoints(include_exported)
             if not available_checkpoints:
                 print("No checkpoints found.")
                 return None
             print("Available checkpoints:")
-            for idx, (experiment, checkpoint) in enumerate(available_checkpoints, 1):
-                print(f"[{idx}] {experiment}/training_checkpoints/{checkpoint}")
+            for idx, (experiment, folder, checkpoint) in enumerate(available_checkpoints, 1):
+                print(f"[{idx}] {experiment}/{folder}/{checkpoint}")
             selection = int(input("Please select a checkpoint by entering the number beside it: "))
             if 1 <= selection <= len(available_checkpoints):
-                experiment, checkpoint = available_checkpoints[selection - 1]
-                print(f"You've selected checkpoint {checkpoint} from {experiment}/training_checkpoints. Proceeding with this checkpoint..")
+                experiment, folder, checkpoint = available_checkpoints[selection - 1]
+                print(f"You've selected checkpoint {checkpoint} from {experiment}/{folder}. Proceeding with this checkpoint..")
                 checkpoint_path = os.path.join(
                     self.EXPERIMENTS_DIR,
                     experiment,
-                    "training_checkpoints",
-                    checkpoint.replace('.index', '')
+                    folder,
+                    checkpoint
                 )
                 return checkpoint_path
             else:
@@ -110,16 +127,114 @@ class ModelManager:
             print(f"No CSV file found in the provided {data_type} directory.")
             raise ValueError
     
+    def create_data_loader(self, csv_path):
+        """
+        Creates the data loader for the pairs listed in the given CSV file.
+
+        Args:
+            csv_path (str): Path to the CSV file containing image pairs.
+
+        Returns:
+            DataLoader: Data loader for the image pairs.
+        """
+        hyperparameters = self.config["hyperparameters"]
+
+        # Only the py_function pipeline reads images through the data loader
+        cache_bytes = int(hyperparameters["IMAGE_CACHE_MB"] * 2**20) if hyperparameters["PIPELINE"] == "py_function" else 0
+        return DataLoader(csv_path, csv_path, cache_bytes)
+
+    def create_dataset(self, data_loader, shuffle=False, repeat=False, start_step=0):
+        """
+        Creates the TensorFlow dataset for the pairs of the given data loader.
+
+        Args:
+            data_loader (DataLoader): Data loader for the image pairs.
+            shuffle (bool, optional): Whether to shuffle the pairs on every iteration. Defaults to False.
+            repeat (bool, optional): Whether to repeat the pairs endlessly, for training. Defaults to False.
+            start_step (int, optional): Number of batches to skip when repeating, to resume training at this step. Defaults to 0.
+
+        Returns:
+            tf.data.Dataset: A TensorFlow dataset containing image pairs.
+        """
+        hyperparameters = self.config["hyperparameters"]
+        dataset         = Dataset(
+            data_loader,
+            hyperparameters["BUFFER_SIZE"],
+            hyperparameters["BATCH_SIZE"],
+            hyperparameters["PIPELINE"],
+            hyperparameters["CACHE_DIR"],
+            hyperparameters["NUM_SHARDS"],
+            shuffle,
+            hyperparameters["SHUFFLE_SEED"],
+            hyperparameters["VARIABLE_RESOLUTION"],
+            repeat,
+            start_step,
+        )
+        return dataset.create_dataset()
+
+    @staticmethod
+    def restore_generator(checkpoint_path, variable_resolution=False):
+        """
+        Restores the generator of a training checkpoint. The discriminator and optimizer slots are not read.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint.
+            variable_resolution (bool, optional): Whether to build the generator with unknown height and width. Defaults to False.
+
+        Returns:
+            Generator: The restored generator.
+        """
+        if not os.path.exists(checkpoint_path + ".index"):
+            print(50*"-")
+            print(f"Checkpoint file {checkpoint_path}.index does not exist.")
+            raise ValueError
+
+        generator = Generator()
+        generator.build_model(variable_resolution=variable_resolution)
+        status = tf.train.Checkpoint(generator=generator.model).restore(checkpoint_path)
+        status.expect_partial().assert_existing_objects_matched()
+        return generator
+
+    def load_generator(self, checkpoint_path):
+        """
+        Load the generator used for predictions, either from a generator exported by the ExportManager
+        or from a training checkpoint. Only the generator is built and restored.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+
+        Returns:
+            callable: Function predicting the output images for a batch of input images.
+        """
+        stochastic = self.config["hyperparameters"]["STOCHASTIC_INFERENCE"]
+        if ExportedGenerator.is_exported(checkpoint_path):
+            if stochastic:
+                print(50*"-")
+                print("Exported generators are deterministic. Set STOCHASTIC_INFERENCE to false or select a training checkpoint.")
+                raise ValueError
+            return ExportedGenerator(checkpoint_path)
+
+        generator = self.restore_generator(checkpoint_path, self.config["hyperparameters"]["VARIABLE_RESOLUTION"])
+
+        # Deterministic predictions from the folded generator, unless stochastic sampling is requested,
+        # which keeps dropout active and normalizes with the statistics of each batch
+        if stochastic:
+            return lambda input: generator.model(input, training=True)
+        return InferenceGenerator(generator)
+
     @staticmethod
-    def create_and_build_models():
+    def create_and_build_models(variable_resolution=False):
         """
         Creates and builds the generator and discriminator models.
 
+        Args:
+            variable_resolution (bool, optional): Whether to build the models with unknown height and width. Defaults to False.
+
         Returns:
             tuple: Generator and discriminator models.
         """
         generator     = Generator()
         discriminator = Discriminator()
-        generator.build_model()
-        discriminator.build_model()
+        generator.build_model(variable_resolution=variable_resolution)
+        discriminator.build_model(variable_resolution=variable_resolution)
         return generator, discriminator
\ No newline at end of file
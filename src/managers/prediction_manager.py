@@ -0,0 +1,247 @@
+import os
+import glob
+import time
+import datetime
+import traceback
+import collections
+import numpy as np
+
+from astropy.io import fits
+from utils.writer_pool import WriterPool
+from concurrent.futures import ThreadPoolExecutor
+from pix2pix.tiling import TiledPredictor
+from managers.model_manager import ModelManager
+
+class PredictionManager(ModelManager):
+    """
+    The PredictionManager class is responsible for predicting the output maps of input FITS maps of any size,
+    such as full active-region or full-disk maps, with a trained generator, without targets. Maps larger than
+    the 256x256 input of the generator are predicted in overlapping tiles (see pix2pix.tiling), unless the
+    generator has a variable resolution and their height and width are multiples of 256.
+    It is used by the prediction mode of main.py and by the non-interactive predict.py script.
+    It inherits from the ModelManager class.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the PredictionManager class.
+        """
+        super().__init__(*args, **kwargs)
+
+    def get_default_prediction_path(self, checkpoint_path):
+        """
+        Get a unique path to save the predictions based on the current timestamp and checkpoint name.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+
+        Returns:
+            str: Path of the predictions, in the predictions folder of the experiment.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        base_dir  = os.path.dirname(os.path.dirname(os.path.normpath(checkpoint_path)))
+        return os.path.join(base_dir, "predictions", f"{timestamp}_{os.path.basename(os.path.normpath(checkpoint_path))}")
+
+    @staticmethod
+    def list_input_files(input_path):
+        """
+        List the FITS files to predict.
+
+        Args:
+            input_path (str): Directory of the input FITS files, or a glob pattern such as "data/*.fits".
+
+        Returns:
+            list: Sorted paths of the input files.
+        """
+        if os.path.isdir(input_path):
+            input_files = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.endswith(".fits")]
+        else:
+            input_files = [f for f in glob.glob(input_path) if os.path.isfile(f)]
+
+        if not input_files:
+            print(50*"-")
+            print(f"No FITS file found in {input_path}.")
+            raise ValueError
+        return sorted(input_files)
+
+    @staticmethod
+    def get_output_path(input_file, output_dir):
+        """
+        Get the path of the prediction of an input file.
+
+        Args:
+            input_file (str): Path to the input FITS file.
+            output_dir (str): Directory of the predictions.
+
+        Returns:
+            str: Path of the prediction, <name>_predicted.fits in the output directory.
+        """
+        return os.path.join(output_dir, f"{os.path.splitext(os.path.basename(input_file))[0]}_predicted.fits")
+
+    @staticmethod
+    def save_prediction(output_path, prediction):
+        """
+        Save a prediction as a FITS file. The file is written under a temporary name and then renamed, so an
+        interrupted run never leaves a partial file under the final name.
+
+        Args:
+            output_path (str): Path of the prediction.
+            prediction (numpy.ndarray): Predicted map, of shape (height, width, channels).
+        """
+        temporary_path = output_path + ".tmp"
+        fits.writeto(temporary_path, prediction, overwrite=True)
+        os.replace(temporary_path, output_path)
+
+    @staticmethod
+    def read_map(file_path):
+        """
+        Read an input map with astropy, so scaled (BSCALE/BZERO), integer and compressed images are decoded to
+        their physical values. The map is read from the first HDU holding data.
+
+        Args:
+            file_path (str): Path to the input FITS file.
+
+        Returns:
+            numpy.ndarray: The map as float32, of shape (height, width, 3).
+
+        Raises:
+            ValueError: If the file holds no image data, or not a (height, width, 3) cube. Its message gives the reason.
+        """
+        with fits.open(file_path) as hdul:
+            hdu = next((hdu for hdu in hdul if hdu.is_image and hdu.data is not None), None)
+            if hdu is None:
+                raise ValueError("no image data")
+            if hdu.data.ndim != 3 or hdu.data.shape[-1] != 3:
+                raise ValueError(f"expected a (height, width, 3) cube, got shape {hdu.data.shape} in HDU {hdul.index_of(hdu)}")
+            return np.array(hdu.data, dtype=np.float32)
+
+    def read_maps(self, input_files, num_threads):
+        """
+        Read the input maps in a pool of threads, in order. At most twice as many files as threads are read ahead,
+        so a slow generator does not queue every map in memory.
+
+        Args:
+            input_files (list): Paths of the input FITS files.
+            num_threads (int): Number of reader threads.
+
+        Yields:
+            tuple: The path of each file, its map, or None if it could not be read, and the reason it could not be read.
+        """
+        def result(path, future):
+            try:
+                return path, future.result(), None
+            except Exception as e:
+                return path, None, str(e) or type(e).__name__
+
+        with ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix="reader") as executor:
+            pending = collections.deque()
+            for input_file in input_files:
+                pending.append((input_file, executor.submit(self.read_map, input_file)))
+                if len(pending) > 2 * num_threads:
+                    yield result(*pending.popleft())
+            while pending:
+                yield result(*pending.popleft())
+
+    def predict_files(self, checkpoint_path, input_files, output_dir, batch_size=None, overwrite=False):
+        """
+        Predict the output map of every input file, and save each as <name>_predicted.fits.
+
+        Input files whose prediction already exists are skipped unless overwrite is set, so an interrupted run
+        resumes where it stopped. The remaining files are read by a pool of threads (see read_maps). Maps of the
+        input size of the generator are predicted in batches, other maps one at a time with the TiledPredictor, and
+        the predictions are written by a pool of threads. Files that cannot be read are reported with the reason and skipped.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+            input_files (list): Paths of the input FITS files, each holding a (height, width, 3) cube.
+            output_dir (str): Directory in which the predicted FITS files are written.
+            batch_size (int, optional): Number of maps predicted per batch. Defaults to BATCH_SIZE.
+            overwrite (bool, optional): Whether to predict the files whose prediction already exists. Defaults to False.
+
+        Returns:
+            dict: Number of "predicted", "skipped" and "failed" input files.
+        """
+        hyperparameters = self.config["hyperparameters"]
+        batch_size      = batch_size or hyperparameters["BATCH_SIZE"]
+
+        os.makedirs(output_dir, exist_ok=True)
+        pending = [f for f in input_files if overwrite or not os.path.exists(self.get_output_path(f, output_dir))]
+        skipped = len(input_files) - len(pending)
+        print(f"{len(pending)} files to predict, {skipped} already predicted")
+        if not pending:
+            return {"predicted": 0, "skipped": skipped, "failed": 0}
+
+        predict   = self.load_generator(checkpoint_path)
+        predictor = TiledPredictor(
+            predict,
+            overlap             = hyperparameters["TILE_OVERLAP"],
+            batch_size          = hyperparameters["TILE_BATCH_SIZE"],
+            variable_resolution = getattr(predict, "variable_resolution", hyperparameters["VARIABLE_RESOLUTION"]),
+        )
+
+        start     = time.time()
+        predicted = 0
+        with WriterPool(hyperparameters["EVAL_WRITER_THREADS"]) as writer_pool:
+            batch_paths, batch_images = [], []
+
+            def flush():
+                predictions = np.asarray(predict(np.stack(batch_images)))
+                for path, prediction in zip(batch_paths, predictions):
+                    writer_pool.submit(self.save_prediction, self.get_output_path(path, output_dir), prediction)
+                batch_paths.clear()
+                batch_images.clear()
+
+            for path, image, error in self.read_maps(pending, hyperparameters["PREDICT_READER_THREADS"]):
+                if image is None:
+                    print(f"Skipped {path}: {error}")
+                    continue
+
+                if image.shape[:2] == (predictor.tile_size, predictor.tile_size):
+                    batch_paths.append(path)
+                    batch_images.append(image)
+                    if len(batch_images) == batch_size:
+                        flush()
+                else:
+                    writer_pool.submit(self.save_prediction, self.get_output_path(path, output_dir), predictor(image))
+
+                predicted += 1
+                if predicted % 100 == 0:
+                    print(f"Predicted {predicted}/{len(pending)} files ({predicted / (time.time() - start):.2f} files/sec)")
+            if batch_images:
+                flush()
+
+        failed = len(pending) - predicted
+        print(f"Predicted {predicted} files in {time.time() - start:.2f} sec, skipped {skipped}, failed {failed}. Predictions saved to {output_dir}")
+        return {"predicted": predicted, "skipped": skipped, "failed": failed}
+
+    def predict_maps(self, checkpoint_path, input_dir, output_dir):
+        """
+        Predict the output map of every FITS file in a directory (see predict_files).
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+            input_dir (str): Directory of the input FITS files.
+            output_dir (str): Directory in which the predicted FITS files are written.
+
+        Returns:
+            dict: Number of "predicted", "skipped" and "failed" input files.
+        """
+        return self.predict_files(checkpoint_path, self.list_input_files(input_dir), output_dir)
+
+    def orchestrate_prediction(self):
+        """
+        Orchestrates the prediction of large maps, including prompting the user for the checkpoint and the input directory.
+        """
+        try:
+            checkpoint_path = self.prompt_for_checkpoint(include_exported=True)
+            input_dir       = input("Please enter the path to the directory of the FITS maps to predict: ")
+            if not os.path.isdir(input_dir):
+                print(50*"-")
+                print(f"Directory {input_dir} does not exist.")
+                raise ValueError
+
+            self.predict_maps(checkpoint_path, input_dir, self.get_default_prediction_path(checkpoint_path))
+
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            traceback.print_exc()
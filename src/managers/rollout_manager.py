@@ -0,0 +1,206 @@
+import os
+import datetime
+import traceback
+import tensorflow as tf
+import matplotlib.pyplot as plt
+
+from astropy.io import fits
+from prettytable import PrettyTable
+from data.shard_store import ShardStore
+from data.fits_decoder import FITSDecoder
+from data.dataset_compiler import DatasetCompiler
+from utils.writer_pool import WriterPool
+from pix2pix.rollout import RolloutEngine
+from managers.model_manager import ModelManager
+from managers.user_input_manager import UserInputManager
+
+class RolloutManager(ModelManager):
+    """
+    The RolloutManager class is responsible for forecasting several time intervals ahead by feeding the
+    predictions of the generator back as its inputs (see pix2pix.rollout), and for measuring how the
+    errors grow with the horizon on sequences of files listed in a pairs.csv file.
+    It inherits from the ModelManager class.
+    """
+
+    # Metrics reported for each step of the rollouts
+    CURVE_METRICS = ("mse", "mae", "psnr", "ssim", "pearson")
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the RolloutManager class.
+        """
+        super().__init__(*args, **kwargs)
+
+    def get_default_rollout_path(self, checkpoint_path):
+        """
+        Get a unique path to save the rollout results based on the current timestamp and checkpoint name.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+
+        Returns:
+            str: Path of the rollout results, in the rollouts folder of the experiment.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        base_dir  = os.path.dirname(os.path.dirname(os.path.normpath(checkpoint_path)))
+        return os.path.join(base_dir, "rollouts", f"{timestamp}_{os.path.basename(os.path.normpath(checkpoint_path))}")
+
+    def create_rollout_dataset(self, csv_path, horizon):
+        """
+        Creates a dataset of rollouts from every input file of a pairs.csv file, with the ground truth of each step.
+
+        The files of each sequence (see RolloutEngine.build_sequences) are decoded once, in parallel, and the rollout
+        from each input file is the window of the horizon + 1 files starting at that file. Missing targets at the end
+        of a sequence are zeros, masked out by valid. Several sequences are read at a time.
+
+        The images of a dataset store split are read from its shards. The rollouts start from the inputs of the split,
+        but the sequences follow all the pairs of the store, as the pairs of a sequence are spread over the splits.
+
+        Args:
+            csv_path (str): Path to the CSV file containing image pairs.
+            horizon (int): Number of steps of the rollouts.
+
+        Returns:
+            tf.data.Dataset: Dataset yielding (names, input images, targets, valid) batches, as expected by RolloutEngine.evaluate.
+        """
+        data_loader    = self.create_data_loader(csv_path)
+        pairs          = [(str(input_file), str(target_file)) for input_file, target_file in data_loader.pairs.itertuples(index=False)]
+        sequence_pairs = pairs
+        image_shape    = (None, None, 3) if self.config["hyperparameters"]["VARIABLE_RESOLUTION"] else (256, 256, 3)
+
+        # Pairs from a dataset store have no FITS files, their images are read from the memory-mapped shards
+        if data_loader.store_dir is not None:
+            manifest       = DatasetCompiler.load_manifest(data_loader.store_dir)
+            store          = ShardStore(data_loader.store_dir, manifest)
+            sequence_pairs = [tuple(pair) for pair in manifest.get("pairs", pairs)]
+
+        # Keep the part of each sequence from its first rollout to the last target of its last rollout
+        input_files = {input_file for input_file, _ in pairs}
+        sequences   = []
+        is_input    = []
+        for sequence in RolloutEngine.build_sequences(sequence_pairs):
+            starts = [idx for idx, image_file in enumerate(sequence[:-1]) if image_file in input_files]
+            if starts:
+                sequence = sequence[starts[0]:starts[-1] + horizon + 1]
+                sequences.append(sequence)
+                is_input.append([image_file in input_files for image_file in sequence[:-1]] + [False])
+
+        if data_loader.store_dir is not None:
+            sources = sequences
+            def load(name):
+                image = tf.py_function(lambda name: store.get_tensor(name.numpy().decode("utf-8")), [name], tf.float32)
+                return tf.ensure_shape(image, image_shape)
+        else:
+            sources = [[str(data_loader.get_file_path(image_file)) for image_file in sequence] for sequence in sequences]
+            def load(path):
+                return FITSDecoder.read(path, image_shape)
+
+        def to_rollout(name, images):
+            num_targets = tf.shape(images)[0] - 1
+            missing     = tf.zeros(tf.concat([[horizon - num_targets], tf.shape(images)[1:]], axis=0))
+            targets     = tf.concat([images[1:], missing], axis=0)
+            return name, images[0], tf.ensure_shape(targets, (horizon,) + image_shape), tf.range(horizon) < num_targets
+
+        def sequence_rollouts(names, is_input, sources):
+            images  = tf.data.Dataset.from_tensor_slices(sources).map(load, num_parallel_calls=tf.data.AUTOTUNE)
+            windows = tf.data.Dataset.from_tensor_slices((names, is_input))
+            windows = tf.data.Dataset.zip((windows, images)).window(horizon + 1, shift=1)
+            windows = windows.flat_map(lambda files, images: tf.data.Dataset.zip((files[0].take(1), files[1].take(1), images.batch(horizon + 1))))
+            windows = windows.filter(lambda name, is_input, images: is_input)
+            return windows.map(lambda name, is_input, images: to_rollout(name, images))
+
+        dataset = tf.data.Dataset.from_tensor_slices((tf.ragged.constant(sequences), tf.ragged.constant(is_input), tf.ragged.constant(sources)))
+        dataset = dataset.interleave(sequence_rollouts, num_parallel_calls=tf.data.AUTOTUNE)
+        dataset = dataset.batch(self.config["hyperparameters"]["BATCH_SIZE"])
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+        return dataset
+
+    def save_rollout_results(self, save_path, curves):
+        """
+        Save the error curves of the rollouts to ROLLOUT_METRICS.CSV and plot them to ROLLOUT_METRICS.PNG.
+
+        Args:
+            save_path (str): Path to save the rollout results.
+            curves (dict): Error curves, as returned by RolloutEngine.error_curves.
+        """
+        os.makedirs(save_path, exist_ok=True)
+        horizon = len(curves["count"])
+
+        csv_path = os.path.join(save_path, "ROLLOUT_METRICS.CSV")
+        with open(csv_path, "w") as file:
+            columns = ["count"] + [name for name in curves if name != "count"]
+            file.write(",".join(["step"] + columns) + "\n")
+            for step in range(horizon):
+                file.write(",".join([str(step + 1)] + [str(curves[column][step]) for column in columns]) + "\n")
+
+        figure, axes = plt.subplots(1, len(self.CURVE_METRICS), figsize=(4 * len(self.CURVE_METRICS), 3.5))
+        for axis, name in zip(axes, self.CURVE_METRICS):
+            axis.plot(range(1, horizon + 1), curves[name], marker="o")
+            axis.set_title(name.upper())
+            axis.set_xlabel("Step")
+            axis.grid(True)
+        figure.tight_layout()
+        plot_path = os.path.join(save_path, "ROLLOUT_METRICS.PNG")
+        figure.savefig(plot_path)
+        plt.close(figure)
+        print(f"Rollout results saved to {csv_path} and {plot_path}")
+
+    def run_rollouts(self, checkpoint_path, csv_path, horizon, save_path, save_predictions=False):
+        """
+        Run a rollout of the given horizon from every input file of a pairs.csv file, print the error curves and save them.
+
+        Args:
+            checkpoint_path (str): Path to the model checkpoint, or to the directory of an exported generator.
+            csv_path (str): Path to the CSV file containing image pairs.
+            horizon (int): Number of steps of the rollouts.
+            save_path (str): Path to save the rollout results.
+            save_predictions (bool, optional): Whether to save the prediction of every step as <name>_step<n>.fits. Defaults to False.
+
+        Returns:
+            dict: Error curves, as returned by RolloutEngine.error_curves.
+        """
+        if horizon < 1:
+            print(50*"-")
+            print(f"Error: The rollout horizon must be at least 1, got {horizon}.")
+            raise ValueError
+
+        engine  = RolloutEngine(self.load_generator(checkpoint_path))
+        dataset = self.create_rollout_dataset(csv_path, horizon)
+
+        predictions_path = os.path.join(save_path, "predictions")
+        if save_predictions:
+            os.makedirs(predictions_path, exist_ok=True)
+        with WriterPool(self.config["hyperparameters"]["EVAL_WRITER_THREADS"]) as writer_pool:
+            def save_step(step, names, prediction):
+                for name, image in zip(names, prediction.numpy()):
+                    output_path = os.path.join(predictions_path, f"{os.path.splitext(name)[0]}_step{step}.fits")
+                    writer_pool.submit(fits.writeto, output_path, image, overwrite=True)
+
+            metrics = engine.evaluate(dataset, horizon, save_step if save_predictions else None)
+
+        curves = RolloutEngine.error_curves(metrics)
+        table  = PrettyTable()
+        table.field_names = ["Step", "Rollouts"] + [name.upper() for name in self.CURVE_METRICS]
+        for step in range(horizon):
+            table.add_row([step + 1, curves["count"][step]] + [f"{curves[name][step]:.6f}" for name in self.CURVE_METRICS])
+        print(table)
+
+        self.save_rollout_results(save_path, curves)
+        return curves
+
+    def orchestrate_rollout(self):
+        """
+        Orchestrates the rollouts, including prompting the user for the checkpoint, the data and the horizon.
+        """
+        try:
+            checkpoint_path = self.prompt_for_checkpoint(include_exported=True)
+            csv_path        = os.path.join(self.get_data_directory("rollout"), "pairs.csv")
+            horizon         = input(f"Please enter the rollout horizon (default {self.config['hyperparameters']['ROLLOUT_HORIZON']}): ").strip()
+            horizon         = int(horizon) if horizon else self.config["hyperparameters"]["ROLLOUT_HORIZON"]
+
+            save_predictions = UserInputManager.query_yes_no("Do you want to save the predictions of every step?")
+            self.run_rollouts(checkpoint_path, csv_path, horizon, self.get_default_rollout_path(checkpoint_path), save_predictions)
+
+        except Exception as e:
+            print(f"An error occurred: {str(e)}")
+            traceback.print_exc()
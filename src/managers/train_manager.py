@@ -5,9 +5,7 @@ import datetime
 import traceback
 import tensorflow as tf
 
-from data.dataset import Dataset
 from pix2pix.train import Trainer
-from data.data_loader import DataLoader
 from managers.file_manager import FileManager
 from managers.model_manager import ModelManager
 from managers.user_input_manager import UserInputManager
@@ -50,13 +48,7 @@ class TrainingManager(ModelManager):
         - experiment_dir (str): Path to the directory where the experiment data will be stored.
         - checkpoint_path (str, optional): Path to a checkpoint to resume training from. Defaults to None.
         """
-        train_data_loader = DataLoader(train_csv_path, train_csv_path)
-        train_dataset     = Dataset(train_data_loader, self.config["hyperparameters"]["BUFFER_SIZE"], self.config["hyperparameters"]["BATCH_SIZE"]).create_dataset()
-
-        test_data_loader = DataLoader(test_csv_path, test_csv_path)
-        test_dataset     = Dataset(test_data_loader, self.config["hyperparameters"]["BUFFER_SIZE"], self.config["hyperparameters"]["BATCH_SIZE"]).create_dataset()
-
-        generator, discriminator = self.create_and_build_models()
+        generator, discriminator = self.create_and_build_models(self.config["hyperparameters"]["VARIABLE_RESOLUTION"])
 
         with open(os.path.join(experiment_dir, "hyperparameters.yaml"), "w") as file:
             yaml.dump(self.config, file)
@@ -66,11 +58,29 @@ class TrainingManager(ModelManager):
 
         summary_writer    = tf.summary.create_file_writer(log_dir)
         checkpoint_prefix = os.path.join(checkpoint_dir, "ckpt")
-        trainer           = Trainer(generator, discriminator, summary_writer, checkpoint_prefix)
+        trainer           = Trainer(
+            generator,
+            discriminator,
+            summary_writer,
+            checkpoint_prefix,
+            jit_compile                   = self.config["hyperparameters"]["JIT_COMPILE"],
+            steps_per_execution           = self.config["hyperparameters"]["STEPS_PER_EXECUTION"],
+            log_freq                      = self.config["hyperparameters"]["LOG_FREQ"],
+            max_to_keep                   = self.config["hyperparameters"]["MAX_TO_KEEP"],
+            async_checkpoint              = self.config["hyperparameters"]["ASYNC_CHECKPOINT"],
+            keep_checkpoint_every_n_hours = self.config["hyperparameters"]["KEEP_CHECKPOINT_EVERY_N_HOURS"],
+        )
 
         if checkpoint_path:
             trainer.checkpoint.restore(checkpoint_path)
 
+        # The training data skips the batches of the steps already trained, so a resumed run sees the same pairs
+        train_data_loader = self.create_data_loader(train_csv_path)
+        train_dataset     = self.create_dataset(train_data_loader, shuffle=True, repeat=True, start_step=int(trainer.step.numpy()))
+
+        test_data_loader = self.create_data_loader(test_csv_path)
+        test_dataset     = self.create_dataset(test_data_loader)
+
         start_time = time.time()
         trainer.fit(train_dataset, test_dataset, steps=self.config["hyperparameters"]["STEPS"], experiment_dir=experiment_dir, save_freq=self.config["hyperparameters"]["SAVE_FREQ"])        
         end_time = time.time()
@@ -79,6 +89,8 @@ class TrainingManager(ModelManager):
         hours, remainder = divmod(total_time, 3600)
         minutes, seconds = divmod(remainder, 60)
         print(f"\nTraining completed in {int(hours)}h {int(minutes)}m {int(seconds)}s")
+        if train_data_loader.cache is not None:
+            train_data_loader.cache.report()
         print("Training finished!")
 
 
@@ -27,14 +27,14 @@ class UserInputManager:
     @staticmethod
     def get_action():
         """
-        Prompts the user to choose between training or evaluating and returns the user's choice.
+        Prompts the user to choose between training, evaluating, compiling a dataset, exporting a generator, predicting maps or running rollouts and returns the user's choice.
 
         Returns:
-            str: 't' for training or 'e' for evaluating.
+            str: 't' for training, 'e' for evaluating, 'c' for compiling a dataset, 'x' for exporting a generator, 'p' for predicting maps or 'r' for running rollouts.
         """
-        action = input("Do you want to train or evaluate? (t/e): ").strip().lower()
-        while action not in ["t", "e"]:
-            print("Invalid input. Please enter t or e.")
-            action = input("Do you want to train or evaluate? (t/e): ").strip().lower()
+        action = input("Do you want to train, evaluate, compile a dataset, export a generator, predict maps or run rollouts? (t/e/c/x/p/r): ").strip().lower()
+        while action not in ["t", "e", "c", "x", "p", "r"]:
+            print("Invalid input. Please enter t, e, c, x, p or r.")
+            action = input("Do you want to train, evaluate, compile a dataset, export a generator, predict maps or run rollouts? (t/e/c/x/p/r): ").strip().lower()
         return action
 
@@ -40,15 +40,20 @@ class Discriminator:
         result.add(tf.keras.layers.LeakyReLU())
         return result
 
-    def build_model(self):
+    def build_model(self, variable_resolution=False):
         """
         Builds the discriminator model architecture.
+
+        Args:
+        - variable_resolution (bool, optional): Whether to build the model with unknown height and width. The patch
+                                                output then scales with the inputs. Defaults to False.
         """
         initializer = tf.random_normal_initializer(0.0, 0.02)
+        image_size  = None if variable_resolution else 256
 
         # Input layers for the source and target images
-        inp = tf.keras.layers.Input(shape=[256, 256, 3], name="input_image")
-        tar = tf.keras.layers.Input(shape=[256, 256, 3], name="target_image")
+        inp = tf.keras.layers.Input(shape=[image_size, image_size, 3], name="input_image")
+        tar = tf.keras.layers.Input(shape=[image_size, image_size, 3], name="target_image")
 
         # Concatenate the source and target images
         x = tf.keras.layers.concatenate([inp, tar])
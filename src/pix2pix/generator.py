@@ -11,12 +11,19 @@ class Generator:
     
     # Weight for the L1 loss in the generator loss function
     LAMBDA = 100
+
+    # Height and width of the inputs of the fixed-resolution model
+    IMAGE_SIZE = 256
+
+    # The 8 downsampling layers halve the resolution 8 times, so the height and width of the inputs
+    # of the variable-resolution model must be multiples of 2**8
+    RESOLUTION_MULTIPLE = 256
     
     # Binary cross-entropy loss object for the generator
     loss_object = tf.keras.losses.BinaryCrossentropy(from_logits=True)
 
     @staticmethod
-    def downsample(filters, size, apply_batchnorm=True):
+    def downsample(filters, size, apply_batchnorm=True, inference=False):
         """
         Downsample layer for the generator model.
         
@@ -24,6 +31,8 @@ class Generator:
         - filters (int): Number of filters for the convolutional layer.
         - size (int): Kernel size for the convolutional layer.
         - apply_batchnorm (bool, optional): Whether to apply batch normalization. Defaults to True.
+        - inference (bool, optional): Whether to build the layer for inference, with the batch normalization
+                                      folded into the bias of the convolution (see pix2pix.inference). Defaults to False.
         
         Returns:
         - tf.keras.Sequential: A sequential model containing the downsample layer.
@@ -37,17 +46,17 @@ class Generator:
                 strides            = 2,
                 padding            = "same",
                 kernel_initializer = initializer,
-                use_bias           = False,
+                use_bias           = inference and apply_batchnorm,
             )
         )
 
-        if apply_batchnorm:
+        if apply_batchnorm and not inference:
             result.add(tf.keras.layers.BatchNormalization())
         result.add(tf.keras.layers.LeakyReLU())
         return result
 
     @staticmethod
-    def upsample(filters, size, apply_dropout=False):
+    def upsample(filters, size, apply_dropout=False, inference=False):
         """
         Upsample layer for the generator model.
         
@@ -55,6 +64,8 @@ class Generator:
         - filters (int): Number of filters for the transposed convolutional layer.
         - size (int): Kernel size for the transposed convolutional layer.
         - apply_dropout (bool, optional): Whether to apply dropout. Defaults to False.
+        - inference (bool, optional): Whether to build the layer for inference, with the batch normalization
+                                      folded into the bias of the convolution and no dropout. Defaults to False.
         
         Returns:
         - tf.keras.Sequential: A sequential model containing the upsample layer.
@@ -68,42 +79,80 @@ class Generator:
                 strides            = 2,
                 padding            = "same",
                 kernel_initializer = initializer,
-                use_bias           = False,
+                use_bias           = inference,
             )
         )
-        result.add(tf.keras.layers.BatchNormalization())
-        if apply_dropout:
+        if not inference:
+            result.add(tf.keras.layers.BatchNormalization())
+        if apply_dropout and not inference:
             result.add(tf.keras.layers.Dropout(0.5))
         result.add(tf.keras.layers.ReLU())
         return result
 
-    def build_model(self):
+    @staticmethod
+    def validate_resolution(images):
+        """
+        Checks that the height and width of a batch of images are multiples of RESOLUTION_MULTIPLE.
+        Static shapes are checked when the function is traced, unknown shapes when it runs.
+
+        Args:
+        - images (tf.Tensor): Batch of images, of shape (batch, height, width, channels).
+
+        Returns:
+        - tf.Tensor: The images, once checked.
+        """
+        height, width = images.shape[1], images.shape[2]
+        if height is not None and width is not None:
+            if height % Generator.RESOLUTION_MULTIPLE or width % Generator.RESOLUTION_MULTIPLE:
+                print(50*"-")
+                print(f"Error: The image height and width must be multiples of {Generator.RESOLUTION_MULTIPLE}, got {height}x{width}.")
+                raise ValueError
+            return images
+
+        check = tf.debugging.assert_equal(
+            tf.shape(images)[1:3] % Generator.RESOLUTION_MULTIPLE,
+            0,
+            message = f"The image height and width must be multiples of {Generator.RESOLUTION_MULTIPLE}",
+        )
+        with tf.control_dependencies([check]):
+            return tf.identity(images)
+
+    def build_model(self, inference=False, variable_resolution=False):
         """
         Builds the generator model architecture.
+
+        Args:
+        - inference (bool, optional): Whether to build the architecture for inference, without batch normalization
+                                      and dropout layers. Its weights are set by pix2pix.inference.InferenceGenerator.
+                                      Defaults to False.
+        - variable_resolution (bool, optional): Whether to build the model with unknown height and width, so a single
+                                                model accepts any multiple of RESOLUTION_MULTIPLE. The weights do not
+                                                depend on the resolution. Defaults to False.
         """
-        inputs = tf.keras.layers.Input(shape=[256, 256, 3])
+        image_size = None if variable_resolution else self.IMAGE_SIZE
+        inputs     = tf.keras.layers.Input(shape=[image_size, image_size, 3])
 
         # Define the downsample layers
         down_stack = [
-            self.downsample(64, 4, apply_batchnorm=False),
-            self.downsample(128, 4),
-            self.downsample(256, 4),
-            self.downsample(512, 4),
-            self.downsample(512, 4),
-            self.downsample(512, 4),
-            self.downsample(512, 4),
-            self.downsample(512, 4),
+            self.downsample(64, 4, apply_batchnorm=False, inference=inference),
+            self.downsample(128, 4, inference=inference),
+            self.downsample(256, 4, inference=inference),
+            self.downsample(512, 4, inference=inference),
+            self.downsample(512, 4, inference=inference),
+            self.downsample(512, 4, inference=inference),
+            self.downsample(512, 4, inference=inference),
+            self.downsample(512, 4, inference=inference),
         ]
 
         # Define the upsample layers
         up_stack = [
-            self.upsample(512, 4, apply_dropout=True),
-            self.upsample(512, 4, apply_dropout=True),
-            self.upsample(512, 4, apply_dropout=True),
-            self.upsample(512, 4),
-            self.upsample(256, 4),
-            self.upsample(128, 4),
-            self.upsample(64, 4),
+            self.upsample(512, 4, apply_dropout=True, inference=inference),
+            self.upsample(512, 4, apply_dropout=True, inference=inference),
+            self.upsample(512, 4, apply_dropout=True, inference=inference),
+            self.upsample(512, 4, inference=inference),
+            self.upsample(256, 4, inference=inference),
+            self.upsample(128, 4, inference=inference),
+            self.upsample(64, 4, inference=inference),
         ]
 
         # Final transposed convolutional layer
@@ -0,0 +1,176 @@
+import os
+import numpy as np
+import tensorflow as tf
+
+from pix2pix.generator import Generator
+
+class InferenceGenerator:
+    """
+    InferenceGenerator class for running a trained generator in inference mode.
+
+    The generator is rebuilt without its BatchNormalization and Dropout layers. Each BatchNormalization
+    layer is folded into the kernel and bias of the preceding Conv2D or Conv2DTranspose layer, using its
+    moving statistics, so the folded model computes the same output as the generator called with
+    training=False, with fewer operations and deterministically.
+    """
+
+    def __init__(self, generator: Generator):
+        """
+        Initialize the InferenceGenerator from a generator, typically restored from a checkpoint.
+
+        Args:
+            generator (Generator): The trained generator.
+        """
+        self.variable_resolution = generator.model.input_shape[1] is None
+
+        inference_generator = Generator()
+        inference_generator.build_model(inference=True, variable_resolution=self.variable_resolution)
+        self.model = inference_generator.model
+        self.fold_weights(generator.model, self.model)
+
+        # A fixed signature with an unknown batch size, so a partial final batch does not retrace the model.
+        # The height and width are unknown as well for a variable-resolution generator.
+        image_spec    = tf.TensorSpec([None] + list(self.model.input_shape[1:]), tf.float32)
+        self._predict = tf.function(
+            lambda input_image: self.model(Generator.validate_resolution(input_image), training=False),
+            input_signature = [image_spec],
+        )
+
+    def __call__(self, input_image):
+        """
+        Predict the output images for a batch of input images.
+
+        Args:
+            input_image: Input image tensor, of shape (batch, height, width, channels).
+
+        Returns:
+            tf.Tensor: The predicted images.
+        """
+        return self._predict(tf.convert_to_tensor(input_image, tf.float32))
+
+    def export(self, export_dir, batch_sizes=(1,)):
+        """
+        Save the folded generator as a SavedModel, which can be loaded with ExportedGenerator without building
+        the models or restoring a training checkpoint.
+
+        The SavedModel has a "serving_default" signature accepting any batch size, and a "serving_batch_<n>"
+        signature traced for each of the given batch sizes.
+
+        Args:
+            export_dir (str): Directory in which the SavedModel is written.
+            batch_sizes (list, optional): Batch sizes for which a signature is traced. Defaults to (1,).
+        """
+        module       = tf.Module()
+        module.model = self.model
+        predict      = tf.function(lambda input_image: {"prediction": self.model(Generator.validate_resolution(input_image), training=False)})
+        image_shape  = list(self.model.input_shape[1:])
+
+        signatures = {"serving_default": predict.get_concrete_function(tf.TensorSpec([None] + image_shape, tf.float32, name="input_image"))}
+        for batch_size in sorted(set(batch_sizes)):
+            signatures[f"serving_batch_{batch_size}"] = predict.get_concrete_function(
+                tf.TensorSpec([batch_size] + image_shape, tf.float32, name="input_image")
+            )
+        tf.saved_model.save(module, export_dir, signatures=signatures)
+
+    @staticmethod
+    def fold_batchnorm(kernel, batchnorm, transposed=False):
+        """
+        Fold a BatchNormalization layer into the kernel of the preceding convolution.
+
+        Args:
+            kernel (numpy.ndarray): Kernel of the convolution, without bias.
+            batchnorm (tf.keras.layers.BatchNormalization): The BatchNormalization layer following the convolution.
+            transposed (bool, optional): Whether the convolution is a Conv2DTranspose, whose kernel stores the
+                                         output channels in the second to last axis. Defaults to False.
+
+        Returns:
+            tuple: The folded kernel and bias.
+        """
+        gamma, beta, moving_mean, moving_variance = [weight.numpy() for weight in batchnorm.weights]
+        scale = gamma / np.sqrt(moving_variance + batchnorm.epsilon)
+        bias  = beta - moving_mean * scale
+        if transposed:
+            return kernel * scale[:, np.newaxis], bias
+        return kernel * scale, bias
+
+    @staticmethod
+    def fold_weights(source_model, target_model):
+        """
+        Copy the weights of a generator into a generator built for inference, folding the BatchNormalization layers.
+
+        Args:
+            source_model (tf.keras.Model): The generator model.
+            target_model (tf.keras.Model): The generator model built with build_model(inference=True).
+        """
+        if len(source_model.layers) != len(target_model.layers):
+            print(50*"-")
+            print(f"Error: The inference model has {len(target_model.layers)} layers, expected {len(source_model.layers)}")
+            raise ValueError
+
+        for source, target in zip(source_model.layers, target_model.layers):
+            if not isinstance(source, tf.keras.Sequential):
+                target.set_weights(source.get_weights())
+                continue
+
+            # Downsample and upsample blocks: a convolution, optionally followed by batch normalization
+            convolution = source.layers[0]
+            batchnorms  = [layer for layer in source.layers if isinstance(layer, tf.keras.layers.BatchNormalization)]
+            kernel      = convolution.kernel.numpy()
+            if batchnorms:
+                transposed = isinstance(convolution, tf.keras.layers.Conv2DTranspose)
+                target.layers[0].set_weights(list(InferenceGenerator.fold_batchnorm(kernel, batchnorms[0], transposed)))
+            else:
+                target.layers[0].set_weights(convolution.get_weights())
+
+class ExportedGenerator:
+    """
+    ExportedGenerator class for running a generator exported with InferenceGenerator.export.
+    """
+
+    def __init__(self, export_dir):
+        """
+        Load an exported generator.
+
+        Args:
+            export_dir (str): Directory of the SavedModel.
+        """
+        if not self.is_exported(export_dir):
+            print(50*"-")
+            print(f"Error: No exported generator found in {export_dir}")
+            raise ValueError
+
+        self.saved_model = tf.saved_model.load(export_dir)
+        self.signatures  = self.saved_model.signatures
+
+        # Generators exported from a variable-resolution model accept any multiple of Generator.RESOLUTION_MULTIPLE
+        input_spec               = self.signatures["serving_default"].structured_input_signature[1]["input_image"]
+        self.variable_resolution = input_spec.shape[1] is None
+
+    @staticmethod
+    def is_exported(export_dir):
+        """
+        Check whether a directory holds an exported generator.
+
+        Args:
+            export_dir (str): Directory to check.
+
+        Returns:
+            bool: True if the directory holds a SavedModel.
+        """
+        return os.path.exists(os.path.join(export_dir, "saved_model.pb"))
+
+    def __call__(self, input_image):
+        """
+        Predict the output images for a batch of input images, using the signature traced for the batch size if any.
+
+        Args:
+            input_image: Input image tensor, of shape (batch, height, width, channels).
+
+        Returns:
+            tf.Tensor: The predicted images.
+        """
+        input_image = tf.convert_to_tensor(input_image, tf.float32)
+        signature   = f"serving_batch_{input_image.shape[0]}"
+        if signature not in self.signatures:
+            signature = "serving_default"
+        return self.signatures[signature](input_image=input_image)["prediction"]
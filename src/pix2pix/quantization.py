@@ -0,0 +1,182 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+
+from prettytable import PrettyTable
+from pix2pix.generator import Generator
+from pix2pix.inference import InferenceGenerator
+
+class TFLiteGenerator:
+    """
+    TFLiteGenerator class for running a generator converted to TensorFlow Lite by the GeneratorQuantizer.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Load a TensorFlow Lite generator.
+
+        Args:
+            model_path (str): Path to the .tflite file.
+            num_threads (int, optional): Number of threads used by the interpreter. Defaults to None, which lets TensorFlow Lite choose.
+        """
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index  = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+
+    def __call__(self, input_image):
+        """
+        Predict the output images for a batch of input images. The images are run one at a time,
+        since the converted generator has a batch size of 1.
+
+        Args:
+            input_image: Input images, of shape (batch, height, width, channels).
+
+        Returns:
+            numpy.ndarray: The predicted images.
+        """
+        predictions = []
+        for image in np.asarray(input_image, dtype=np.float32):
+            self.interpreter.set_tensor(self.input_index, image[np.newaxis])
+            self.interpreter.invoke()
+            predictions.append(self.interpreter.get_tensor(self.output_index)[0])
+        return np.stack(predictions)
+
+class GeneratorQuantizer:
+    """
+    GeneratorQuantizer class for converting a generator to quantized TensorFlow Lite models for CPU inference.
+
+    The BatchNorm-folded inference generator (see pix2pix.inference) is converted with a batch size of 1 in
+    one of the following modes:
+    - "dynamic": int8 weights, with activations quantized dynamically at run time.
+    - "int8": int8 weights and activations, calibrated on a set of input images. Inputs and outputs stay float32.
+    - "float16": float16 weights, computed in float32 on CPU.
+    """
+
+    MODES = ("dynamic", "int8", "float16")
+
+    def __init__(self, generator):
+        """
+        Initialize the GeneratorQuantizer with a trained generator.
+
+        Args:
+            generator (Generator): The trained generator.
+        """
+        self.inference_generator = InferenceGenerator(generator)
+        self.model               = self.inference_generator.model
+
+    def convert(self, mode, calibration_images=None):
+        """
+        Convert the generator to a TensorFlow Lite model.
+
+        Args:
+            mode (str): Quantization mode, one of MODES.
+            calibration_images (list, optional): Input images of shape (height, width, channels), required by the "int8" mode.
+
+        Returns:
+            bytes: The TensorFlow Lite model.
+        """
+        if mode not in self.MODES:
+            print(50*"-")
+            print(f"Unknown quantization mode: {mode}. Expected one of {self.MODES}.")
+            raise ValueError
+
+        # TensorFlow Lite models are converted for 256x256 inputs, even from a variable-resolution generator
+        image_shape = [dim or Generator.IMAGE_SIZE for dim in self.model.input_shape[1:]]
+        predict     = tf.function(lambda input_image: self.model(input_image, training=False))
+        function    = predict.get_concrete_function(tf.TensorSpec([1] + image_shape, tf.float32))
+        converter   = tf.lite.TFLiteConverter.from_concrete_functions([function], self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if mode == "int8":
+            if not calibration_images:
+                print(50*"-")
+                print("Error: The int8 mode requires calibration images.")
+                raise ValueError
+            converter.representative_dataset    = lambda: ([image[np.newaxis].astype(np.float32)] for image in calibration_images)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        elif mode == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+
+        return converter.convert()
+
+    def quantize(self, output_dir, calibration_images, modes=MODES):
+        """
+        Convert the generator in each of the given modes and save the models.
+
+        Args:
+            output_dir (str): Directory in which the models are saved, as generator_<mode>.tflite.
+            calibration_images (list): Input images used to calibrate the "int8" mode.
+            modes (tuple, optional): Quantization modes. Defaults to all modes.
+
+        Returns:
+            dict: Path of the model for each mode.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        model_paths = {}
+        for mode in modes:
+            model_paths[mode] = os.path.join(output_dir, f"generator_{mode}.tflite")
+            with open(model_paths[mode], "wb") as file:
+                file.write(self.convert(mode, calibration_images))
+            print(f"Saved {mode} model to {model_paths[mode]}")
+        return model_paths
+
+    def compare(self, model_paths, test_dataset, num_threads=None):
+        """
+        Compare the quantized models with the float generator on a test set, and print a table of the
+        model size, the latency per image, the MSE to the targets and the MSE to the float predictions.
+
+        Args:
+            model_paths (dict): Path of the model for each mode, as returned by quantize.
+            test_dataset (tf.data.Dataset): Dataset yielding (name, input, target) batches.
+            num_threads (int, optional): Number of threads used by the TensorFlow Lite interpreters. Defaults to None.
+
+        Returns:
+            dict: Size in MB, milliseconds per image, MSE to the targets and MSE to the float predictions for each model.
+        """
+        models = {"float32": self.inference_generator}
+        models.update({mode: TFLiteGenerator(path, num_threads) for mode, path in model_paths.items()})
+        sizes  = {"float32": sum(weight.numpy().nbytes for weight in self.model.weights) / 2**20}
+        sizes.update({mode: os.path.getsize(path) / 2**20 for mode, path in model_paths.items()})
+
+        # Run each model once before timing, so the float generator is traced outside the measurements
+        _, input_image, _ = next(iter(test_dataset))
+        for predict in models.values():
+            predict(input_image)
+
+        totals = {name: {"time": 0.0, "mse_target": 0.0, "mse_float": 0.0} for name in models}
+        count  = 0
+        for _, input_image, target in test_dataset:
+            target           = target.numpy()
+            float_prediction = None
+            for name, predict in models.items():
+                start      = time.perf_counter()
+                prediction = np.asarray(predict(input_image))
+                totals[name]["time"] += time.perf_counter() - start
+                if float_prediction is None:
+                    float_prediction = prediction
+
+                totals[name]["mse_target"] += np.sum(np.mean(np.square(target - prediction), axis=(1, 2, 3)))
+                totals[name]["mse_float"]  += np.sum(np.mean(np.square(float_prediction - prediction), axis=(1, 2, 3)))
+            count += int(input_image.shape[0])
+
+        results = {}
+        table   = PrettyTable()
+        table.field_names = ["Model", "Size (MB)", "ms/image", "MSE to target", "MSE to float32"]
+        for name, total in totals.items():
+            results[name] = {
+                "size_mb"    : sizes[name],
+                "latency_ms" : 1000 * total["time"] / count,
+                "mse_target" : total["mse_target"] / count,
+                "mse_float"  : total["mse_float"] / count,
+            }
+            table.add_row([
+                name,
+                f"{results[name]['size_mb']:.1f}",
+                f"{results[name]['latency_ms']:.1f}",
+                f"{results[name]['mse_target']:.6f}",
+                f"{results[name]['mse_float']:.2e}",
+            ])
+        print(table)
+        return results
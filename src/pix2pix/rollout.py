@@ -0,0 +1,131 @@
+import tensorflow as tf
+
+from utils.metrics import EvaluationMetrics
+
+class RolloutEngine:
+    """
+    RolloutEngine class for forecasting several time intervals ahead with a generator trained to predict the next one.
+
+    The prediction of each step is fed back as the input of the next step. The predictions stay tensors between
+    the steps, so the chain runs on the device of the generator without writing or reading FITS files, and each
+    step is handed to the caller as soon as it is predicted.
+    """
+
+    def __init__(self, predict):
+        """
+        Initialize the RolloutEngine.
+
+        Args:
+            predict (callable): Function predicting the output images for a batch of input images, such as an InferenceGenerator.
+        """
+        self.predict = predict
+
+    @staticmethod
+    def build_sequences(pairs):
+        """
+        Follow the pairs of consecutive files to split the files into sequences, each starting from a file that is not
+        the target of any pair. As the pairs link consecutive time intervals, each file is in a single sequence.
+
+        Args:
+            pairs (list): List of (input file, target file) pairs, the target being the next time interval of the input.
+
+        Returns:
+            list: List of sequences of at least two files, in which each file is the target of the previous one.
+        """
+        next_file    = dict(pairs)
+        target_files = set(next_file.values())
+
+        # Walk each sequence from its first file, then the inputs left over, which can only be part of a cycle
+        starts    = [input_file for input_file in next_file if input_file not in target_files] + list(next_file)
+        walked    = set()
+        sequences = []
+        for start in starts:
+            if start in walked:
+                continue
+            sequence = [start]
+            while sequence[-1] in next_file and sequence[-1] not in walked:
+                walked.add(sequence[-1])
+                sequence.append(next_file[sequence[-1]])
+            sequences.append(sequence)
+        return sequences
+
+    @staticmethod
+    def build_chains(pairs, horizon):
+        """
+        Follow the pairs of consecutive files to find the ground truth of each step of a rollout from every input file.
+
+        Args:
+            pairs (list): List of (input file, target file) pairs, the target being the next time interval of the input.
+            horizon (int): Number of steps of the rollouts.
+
+        Returns:
+            list: List of (input file, target files) tuples, with the target files of steps 1 to at most horizon.
+                  The list of targets is shorter than the horizon when the sequence of files ends earlier.
+                  The chains follow each sequence from its first file (see build_sequences).
+        """
+        return [
+            (sequence[idx], sequence[idx + 1:idx + 1 + horizon])
+            for sequence in RolloutEngine.build_sequences(pairs)
+            for idx in range(len(sequence) - 1)
+        ]
+
+    def rollout(self, input_image, horizon):
+        """
+        Run a rollout from a batch of input images.
+
+        Args:
+            input_image: Input images, of shape (batch, height, width, channels).
+            horizon (int): Number of steps.
+
+        Yields:
+            tuple: The step, from 1 to horizon, and the predicted images of that step as a tensor.
+        """
+        prediction = tf.convert_to_tensor(input_image, tf.float32)
+        for step in range(1, horizon + 1):
+            prediction = self.predict(prediction)
+            yield step, prediction
+
+    def evaluate(self, dataset, horizon, on_step=None):
+        """
+        Run a rollout from every batch of a dataset, and compute the metrics of each step against the ground truth.
+
+        Args:
+            dataset (tf.data.Dataset): Dataset yielding (names, input images, targets, valid) batches, where targets has
+                                       shape (batch, horizon, height, width, channels) and valid, of shape (batch, horizon),
+                                       tells which targets exist.
+            horizon (int): Number of steps.
+            on_step (callable, optional): Function called with the step, the names and the predicted images of each step,
+                                          for example to save the predictions. Defaults to None.
+
+        Returns:
+            list: The EvaluationMetrics of each step, from 1 to horizon.
+        """
+        metrics = [EvaluationMetrics() for _ in range(horizon)]
+        for names, input_image, targets, valid in dataset:
+            names = [name.decode("utf-8") for name in names.numpy()]
+            for step, prediction in self.rollout(input_image, horizon):
+                if on_step is not None:
+                    on_step(step, names, prediction)
+
+                mask = valid[:, step - 1]
+                if tf.reduce_any(mask):
+                    metrics[step - 1].update(tf.boolean_mask(targets[:, step - 1], mask), tf.boolean_mask(prediction, mask))
+        return metrics
+
+    @staticmethod
+    def error_curves(metrics):
+        """
+        Summarize the metrics of each step of the rollouts as curves over the horizon.
+
+        Args:
+            metrics (list): The EvaluationMetrics of each step, as returned by evaluate.
+
+        Returns:
+            dict: For "count" and each metric name in EvaluationMetrics.METRIC_NAMES, the list of values from step 1 to the horizon.
+                  The value of a metric is the mean over the rollouts with a ground truth at that step.
+        """
+        summaries = [step_metrics.summary() for step_metrics in metrics]
+        curves    = {"count": [summary["mse"]["count"] for summary in summaries]}
+        for name in EvaluationMetrics.METRIC_NAMES:
+            curves[name] = [summary[name]["mean"] if summary[name]["count"] else float("nan") for summary in summaries]
+        return curves
@@ -0,0 +1,113 @@
+import itertools
+import numpy as np
+
+class TiledPredictor:
+    """
+    TiledPredictor class for running the generator on maps larger than its 256x256 input.
+
+    The map is split into overlapping tiles, which are predicted in batches. Each predicted tile is
+    weighted by a window that tapers to the tile borders across the overlap, and the weighted tiles are
+    summed and normalized by the summed weights, so the seams between tiles are blended. Only one batch
+    of tiles and the accumulated output are held in memory, whatever the size of the map.
+
+    A variable-resolution generator predicts maps whose height and width are multiples of the tile size
+    in a single call instead, without tiling.
+    """
+
+    def __init__(self, predict, tile_size=256, overlap=64, batch_size=8, variable_resolution=False):
+        """
+        Initialize the TiledPredictor.
+
+        Args:
+            predict (callable): Function predicting the output images for a batch of input images, such as an InferenceGenerator.
+            tile_size (int, optional): Height and width of the tiles, the input size of the generator. Defaults to 256.
+            overlap (int, optional): Number of pixels shared by neighbouring tiles. Defaults to 64.
+            batch_size (int, optional): Number of tiles predicted per batch. Defaults to 8.
+            variable_resolution (bool, optional): Whether the generator accepts any multiple of the tile size. Defaults to False.
+        """
+        if not 0 <= overlap < tile_size:
+            print(50*"-")
+            print(f"Error: The tile overlap must be between 0 and {tile_size - 1}, got {overlap}.")
+            raise ValueError
+
+        self.predict    = predict
+        self.tile_size  = tile_size
+        self.overlap    = overlap
+        self.batch_size = batch_size
+        self.window     = self.blending_window(tile_size, overlap)
+
+        self.variable_resolution = variable_resolution
+
+    @staticmethod
+    def tile_starts(length, tile_size, overlap):
+        """
+        Compute the start offsets of the tiles along an axis. The last tile is aligned with the end of the axis.
+
+        Args:
+            length (int): Length of the axis, at least tile_size.
+            tile_size (int): Length of the tiles.
+            overlap (int): Minimum number of pixels shared by neighbouring tiles.
+
+        Returns:
+            list: Start offsets of the tiles.
+        """
+        stride = tile_size - overlap
+        starts = list(range(0, length - tile_size, stride))
+        return starts + [length - tile_size]
+
+    @staticmethod
+    def blending_window(tile_size, overlap):
+        """
+        Compute the weights of the pixels of a tile: 1 in the center, decreasing as a squared sine across the
+        overlap at each border. The weights stay positive, so pixels covered by a single tile keep its prediction.
+
+        Args:
+            tile_size (int): Height and width of the tiles.
+            overlap (int): Number of pixels shared by neighbouring tiles.
+
+        Returns:
+            numpy.ndarray: Weights of shape (tile_size, tile_size, 1).
+        """
+        weights = np.ones(tile_size, dtype=np.float32)
+        if overlap > 0:
+            ramp               = np.sin(0.5 * np.pi * (np.arange(overlap) + 0.5) / overlap) ** 2
+            weights[:overlap]  = ramp
+            weights[-overlap:] = ramp[::-1]
+        return np.outer(weights, weights)[:, :, np.newaxis]
+
+    def __call__(self, image):
+        """
+        Predict the output map for an input map.
+
+        Args:
+            image (numpy.ndarray): Input map, of shape (height, width, channels). Maps smaller than a tile are padded by reflection.
+
+        Returns:
+            numpy.ndarray: The predicted map, of the same height and width as the input.
+        """
+        image         = np.asarray(image, dtype=np.float32)
+        height, width = image.shape[:2]
+        if self.variable_resolution and height % self.tile_size == 0 and width % self.tile_size == 0:
+            return np.asarray(self.predict(image[np.newaxis]))[0]
+
+        padding = [(0, max(self.tile_size - height, 0)), (0, max(self.tile_size - width, 0)), (0, 0)]
+        image   = np.pad(image, padding, mode="symmetric")
+
+        positions = list(itertools.product(
+            self.tile_starts(image.shape[0], self.tile_size, self.overlap),
+            self.tile_starts(image.shape[1], self.tile_size, self.overlap),
+        ))
+        output  = None
+        weights = np.zeros(image.shape[:2] + (1,), dtype=np.float32)
+        for idx in range(0, len(positions), self.batch_size):
+            batch = positions[idx:idx + self.batch_size]
+            tiles = np.stack([image[y:y + self.tile_size, x:x + self.tile_size] for y, x in batch])
+            predictions = np.asarray(self.predict(tiles))
+            if output is None:
+                output = np.zeros(image.shape[:2] + predictions.shape[-1:], dtype=np.float32)
+
+            for (y, x), prediction in zip(batch, predictions):
+                output[y:y + self.tile_size, x:x + self.tile_size]  += prediction * self.window
+                weights[y:y + self.tile_size, x:x + self.tile_size] += self.window
+
+        return (output / weights)[:height, :width]
@@ -1,3 +1,4 @@
+import os
 import time
 import tensorflow as tf
 
@@ -12,7 +13,8 @@ class Trainer:
     Trainer class for training a GAN model using the pix2pix architecture.
     """
 
-    def __init__(self, generator: Generator, discriminator: Discriminator, summary_writer, checkpoint_prefix):
+    def __init__(self, generator: Generator, discriminator: Discriminator, summary_writer, checkpoint_prefix, jit_compile=False, steps_per_execution=1, log_freq=100,
+                 max_to_keep=None, keep_checkpoint_every_n_hours=None, async_checkpoint=False):
         """
         Initialize the Trainer class.
 
@@ -21,6 +23,12 @@ class Trainer:
             discriminator (Discriminator): The discriminator model.
             summary_writer: TensorBoard summary writer.
             checkpoint_prefix (str): Prefix for saving checkpoints.
+            jit_compile (bool, optional): Whether to compile the training step with XLA. Defaults to False.
+            steps_per_execution (int, optional): Number of training steps run per call of the traced training loop. Defaults to 1.
+            log_freq (int, optional): Frequency, in steps, at which the mean losses are written to TensorBoard. Defaults to 100.
+            max_to_keep (int, optional): Number of most recent checkpoints to keep. Defaults to None, which keeps all checkpoints.
+            keep_checkpoint_every_n_hours (float, optional): Additionally keep one checkpoint every N hours of training. Defaults to None.
+            async_checkpoint (bool, optional): Whether to write checkpoints in a background thread. Defaults to False.
         """
         self.generator_optimizer     = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
         self.discriminator_optimizer = tf.keras.optimizers.Adam(2e-4, beta_1=0.5)
@@ -28,31 +36,60 @@ class Trainer:
         self.discriminator           = discriminator
         self.summary_writer          = summary_writer
         self.checkpoint_prefix       = checkpoint_prefix
+        self.step                    = tf.Variable(0, dtype=tf.int64, trainable=False, name="step")
         self.checkpoint              = tf.train.Checkpoint(
             generator_optimizer     = self.generator_optimizer,
             discriminator_optimizer = self.discriminator_optimizer,
             generator               = self.generator.model,
-            discriminator           = self.discriminator.model)
-            
+            discriminator           = self.discriminator.model,
+            step                    = self.step)
+        self.steps_per_execution     = steps_per_execution
+        self.log_freq                = log_freq
+
+        # Checkpoints are written and pruned by a manager, unless the Trainer is only used to restore one
+        self.checkpoint_manager = None
+        self.checkpoint_options = tf.train.CheckpointOptions(enable_async=async_checkpoint)
+        if checkpoint_prefix:
+            self.checkpoint_manager = tf.train.CheckpointManager(
+                self.checkpoint,
+                directory                     = os.path.dirname(checkpoint_prefix),
+                max_to_keep                   = max_to_keep,
+                keep_checkpoint_every_n_hours = keep_checkpoint_every_n_hours,
+                checkpoint_name               = os.path.basename(checkpoint_prefix),
+            )
+
+        # Running means of the losses, written to TensorBoard every log_freq steps
+        self.loss_metrics = {
+            name: tf.keras.metrics.Mean(name)
+            for name in ("gen_total_loss", "gen_gan_loss", "gen_l1_loss", "disc_loss")
+        }
+
+        # A fixed signature with an unknown batch size, so a partial final batch does not retrace the step.
+        # Variable-resolution models also leave the height and width unknown, so every resolution shares one trace.
+        image_spec      = tf.TensorSpec([None] + list(self.generator.model.input_shape[1:]), tf.float32)
+        self.train_step = tf.function(self.train_step, input_signature=[image_spec, image_spec], jit_compile=jit_compile)
+
         # Initialize loss attributes
         self.gen_total_loss = None
         self.gen_gan_loss   = None
         self.gen_l1_loss    = None
         self.disc_loss      = None
 
-    @tf.function
-    def train_step(self, input_image, target, step):
+    def train_step(self, input_image, target):
         """
         Perform a single training step.
 
+        The step is traced by a tf.function created in __init__, and compiled with XLA if enabled.
+        The losses are accumulated by train_steps, since XLA cannot compile summary ops.
+
         Args:
             input_image: Input image tensor.
             target: Target tensor.
-            step (int): Current training step.
 
         Returns:
             Tuple containing generator total loss, generator GAN loss, generator L1 loss, and discriminator loss.
         """
+        input_image = Generator.validate_resolution(input_image)
         with tf.GradientTape() as gen_tape, tf.GradientTape() as disc_tape:
             gen_output = self.generator.model(input_image, training=True)
 
@@ -68,18 +105,66 @@ class Trainer:
         self.generator_optimizer.apply_gradients(zip(generator_gradients, self.generator.model.trainable_variables))
         self.discriminator_optimizer.apply_gradients(zip(discriminator_gradients, self.discriminator.model.trainable_variables))
 
-        with self.summary_writer.as_default():
-            tf.summary.scalar('gen_total_loss', gen_total_loss, step=step//1000)
-            tf.summary.scalar('gen_gan_loss', gen_gan_loss, step=step//1000)
-            tf.summary.scalar('gen_l1_loss', gen_l1_loss, step=step//1000)
-            tf.summary.scalar('disc_loss', disc_loss, step=step//1000)
-
         return gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss
 
+    @tf.function
+    def train_steps(self, iterator, num_steps):
+        """
+        Perform several training steps in a single call, reading the batches from the iterator.
+
+        Args:
+            iterator: Iterator over the training dataset.
+            num_steps: Number of training steps to perform, as a scalar tensor so it does not cause retracing.
+
+        Returns:
+            Tuple containing the losses of the last step: generator total loss, generator GAN loss, generator L1 loss, and discriminator loss.
+        """
+        losses = (tf.zeros([]),) * 4
+        for _ in tf.range(num_steps):
+            _, input_image, target = next(iterator)
+            losses = self.train_step(input_image, target)
+            for metric, loss in zip(self.loss_metrics.values(), losses):
+                metric.update_state(loss)
+
+            self.step.assign_add(1)
+            if self.step % self.log_freq == 0:
+                self.write_summaries()
+
+        return losses
+
+    def save_checkpoint(self):
+        """
+        Save a checkpoint, numbered by the training step, and print the time training was blocked by the save.
+        With asynchronous checkpoints, this only covers copying the variables; the files are written in the background.
+
+        Returns:
+            str: Path of the saved checkpoint.
+        """
+        start           = time.time()
+        checkpoint_path = self.checkpoint_manager.save(checkpoint_number=self.step, options=self.checkpoint_options)
+        print(f"\nSaved checkpoint {checkpoint_path} in {time.time() - start:.2f} sec")
+        return checkpoint_path
+
+    @tf.function
+    def write_summaries(self):
+        """
+        Write the mean losses since the last write to TensorBoard, at the current step, and reset them.
+        Traced separately, so the names of the summaries are not prefixed by the scopes of the training loop.
+        """
+        with self.summary_writer.as_default():
+            for name, metric in self.loss_metrics.items():
+                tf.summary.scalar(name, metric.result(), step=self.step)
+                metric.reset_state()
+
     def fit(self, train_ds, test_ds, steps, experiment_dir, save_freq):
         """
         Train the GAN model.
 
+        Only the step counter is saved in the checkpoints, along with the models and optimizers, never the state of
+        the training data iterator. To resume training where it stopped, create the training dataset with
+        repeat=True and start_step set to the restored step (see data.dataset.Dataset). Steps are run in groups of up to steps_per_execution steps per call of train_steps, and the progress
+        table reports the losses of the last step of a group.
+
         Args:
             train_ds: Training dataset.
             test_ds: Testing dataset.
@@ -90,13 +175,20 @@ class Trainer:
         _, example_input, example_target = next(iter(test_ds.take(1)))
         start = time.time()
 
+        train_iterator = iter(train_ds.repeat())
+        step           = int(self.step.numpy())
+
         try:
-            for step, (_, input_image, target) in train_ds.repeat().take(steps).enumerate():
-                gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss = self.train_step(input_image, target, step)
-                if (step) % 1000 == 0:
+            while step < steps:
+                # Stop each execution at the next checkpoint, so checkpoints are saved at the same steps
+                num_steps = min(self.steps_per_execution, steps - step, save_freq - step % save_freq)
+                gen_total_loss, gen_gan_loss, gen_l1_loss, disc_loss = self.train_steps(train_iterator, tf.constant(num_steps))
+                last_step = step + num_steps - 1
+
+                if last_step // 1000 != (step - 1) // 1000:
                     display.clear_output(wait=True)
 
-                    # Extracting the losses for printing
+                    # Extracting the losses of the last step for printing
                     gen_total_loss_value = gen_total_loss.numpy()
                     gen_gan_loss_value   = gen_gan_loss.numpy()
                     gen_l1_loss_value    = gen_l1_loss.numpy()
@@ -111,27 +203,31 @@ class Trainer:
                     table.field_names = ["Step", "Metric", "Value"]
                     table.add_row(["", "Time taken for last 1k steps", f"{time_taken:.2f} sec"])
                     table.add_row(["", "Generator Total Loss", f"{gen_total_loss_value:.4f}"])
-                    table.add_row([f"{step//1000}k", "Generator GAN Loss", f"{gen_gan_loss_value:.4f}"])
+                    table.add_row([f"{last_step//1000}k", "Generator GAN Loss", f"{gen_gan_loss_value:.4f}"])
                     table.add_row(["", "Generator L1 Loss", f"{gen_l1_loss_value:.4f}"])
                     table.add_row(["", "Discriminator Loss", f"{disc_loss_value:.4f}"])
                     print(table)
 
                 # Training step
-                if (step+1) % 10 == 0:
-                    print('.', end='', flush=True)
+                step += num_steps
+                print('.' * (step // 10 - (step - num_steps) // 10), end='', flush=True)
 
                 # Save the model and generate sample image every save_freq steps
-                if (step+1) % save_freq == 0 or (step+1) == steps:
-                    self.checkpoint.save(file_prefix=self.checkpoint_prefix)
-                    ImageProcessor().generate_images(self.generator, example_input, example_target, step, experiment_dir)
+                if step % save_freq == 0 or step == steps:
+                    self.save_checkpoint()
+                    ImageProcessor().generate_images(self.generator, example_input, example_target, last_step, experiment_dir)
+
+            # Wait for the last checkpoint to be written
+            self.checkpoint.sync()
 
         except KeyboardInterrupt:
             print("\nTraining interrupted by user. Saving current progress...")
-            self.checkpoint.save(file_prefix=self.checkpoint_prefix)
+            self.save_checkpoint()
+            self.checkpoint.sync()
             print("Progress saved. Exiting now.")
 
         except Exception as e:
             print(f"Error encountered at step {step}.")
-            print(f"Input Image Shape: {input_image.shape}")
-            print(f"Target Shape: {target.shape}")
+            print(f"Input Image Shape: {train_iterator.element_spec[1].shape}")
+            print(f"Target Shape: {train_iterator.element_spec[2].shape}")
             raise e  # re-raise the exception to see the traceback
@@ -0,0 +1,50 @@
+import sys
+import argparse
+
+from managers.prediction_manager import PredictionManager
+
+def parse_arguments(arguments=None):
+    """
+    Parses the command line arguments of the prediction script.
+
+    Args:
+        arguments (list, optional): Arguments to parse. Defaults to None, which parses sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description = "Predict the output maps of a set of FITS input files with a trained generator. "
+                      "No targets are required. Files whose prediction already exists are skipped, "
+                      "so an interrupted run can be resumed with the same command.",
+    )
+    parser.add_argument("--input", required=True, help="Directory of the input FITS files, or a quoted glob pattern such as 'data/*.fits'.")
+    parser.add_argument("--checkpoint", required=True, help="Path to a training checkpoint (path/to/ckpt-n) or to the directory of an exported generator.")
+    parser.add_argument("--output", required=True, help="Directory in which the predictions are written as <name>_predicted.fits.")
+    parser.add_argument("--batch-size", type=int, default=None, help="Number of maps predicted per batch. Defaults to BATCH_SIZE.")
+    parser.add_argument("--overwrite", action="store_true", help="Predict the files whose prediction already exists as well.")
+    return parser.parse_args(arguments)
+
+def main(arguments=None):
+    """
+    Runs the prediction script.
+
+    Args:
+        arguments (list, optional): Command line arguments. Defaults to None, which parses sys.argv.
+
+    Returns:
+        int: Exit code, 1 if any input file could not be predicted, 0 otherwise.
+    """
+    arguments = parse_arguments(arguments)
+    manager   = PredictionManager()
+    counts    = manager.predict_files(
+        arguments.checkpoint,
+        manager.list_input_files(arguments.input),
+        arguments.output,
+        arguments.batch_size,
+        arguments.overwrite,
+    )
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -40,7 +40,46 @@ class ImageProcessor:
 
         return data
 
-    def generate_images(self, model, input_image_tensor, target_image_tensor, input_filename, image_path, mode="train"):
+    @staticmethod
+    def as_tensor(data):
+        """
+        Convert an array to a float32 tensor, sharing its memory when possible.
+
+        Parameters:
+        - data (numpy.ndarray): Array to convert, for example a view of a memory-mapped file.
+
+        Returns:
+        - tf.Tensor: Tensor holding the data.
+
+        Note:
+        - Native-endian, C-contiguous, writeable float32 arrays are handed to TensorFlow through DLPack
+          without a copy. FITS data is big-endian, so it always goes through a byte-swapping copy; store
+          the data in native byte order (see data.shard_store) to avoid it.
+        """
+        if data.dtype == np.dtype("=f4") and data.flags.c_contiguous and data.flags.writeable:
+            return tf.experimental.dlpack.from_dlpack(data.__dlpack__())
+        return tf.convert_to_tensor(data, dtype=tf.float32)
+
+    @staticmethod
+    def array_to_image(array):
+        """
+        Convert an image array to an RGB PIL image, scaling its values to the full 0-255 range
+        in the same way as tf.keras.preprocessing.image.save_img.
+
+        Parameters:
+        - array (numpy.ndarray): Image array of shape (height, width, 3).
+
+        Returns:
+        - PIL.Image.Image: The RGB image.
+        """
+        array     = np.asarray(array, dtype=np.float32)
+        array     = array - np.min(array)
+        array_max = np.max(array)
+        if array_max > 0:
+            array = array / array_max
+        return Image.fromarray((array * 255).astype(np.uint8), "RGB")
+
+    def generate_images(self, model, input_image_tensor, target_image_tensor, input_filename, image_path, mode="train", prediction=None):
         """
         Generate and save a collage of input, predicted, target, and error images based on the provided tensors.
 
@@ -51,32 +90,29 @@ class ImageProcessor:
         - input_filename (str): Filename of the input image (used for naming the output collage).
         - image_path (str): Path to save the generated collage.
         - mode (str, optional): Mode of operation, either "train" or "eval". Default is "train".
+        - prediction (tensor, optional): Prediction of the model for the input image. If not provided,
+                                         it is computed with the model.
 
         Returns:
         - str: Path to the saved collage image.
 
         Note:
-        - The function first predicts the image using the provided model.
-        - It then converts the tensors to image arrays and saves them.
-        - A collage is created using the saved images, and labels are added to each section.
-        - The saved individual images are then removed, and the path to the collage is returned.
+        - For batched tensors, the collage is rendered for the first image of the batch.
+        - The function first predicts the image using the provided model, unless a prediction is given.
+        - The input, predicted, target and error images are converted to RGB images in memory.
+        - A collage is created from these images, labels are added to each section, and the collage is saved.
         """
-        predicted_image_tensor = model.model(input_image_tensor, training=True)
+        predicted_image_tensor = prediction if prediction is not None else model.model(input_image_tensor, training=True)
 
-        input_image_array     = (input_image_tensor[0].numpy() * 0.5 + 0.5)
-        predicted_image_array = (predicted_image_tensor[0].numpy() * 0.5 + 0.5)
-        target_image_array    = (target_image_tensor[0].numpy() * 0.5 + 0.5)
-        error_image_array     = np.abs(target_image_tensor[0].numpy() - predicted_image_tensor[0].numpy())
+        input_image_array     = (np.asarray(input_image_tensor[0]) * 0.5 + 0.5)
+        predicted_image_array = (np.asarray(predicted_image_tensor[0]) * 0.5 + 0.5)
+        target_image_array    = (np.asarray(target_image_tensor[0]) * 0.5 + 0.5)
+        error_image_array     = np.abs(np.asarray(target_image_tensor[0]) - np.asarray(predicted_image_tensor[0]))
 
-        tf.keras.preprocessing.image.save_img('input_image.png', input_image_array)
-        tf.keras.preprocessing.image.save_img('predicted_image.png', predicted_image_array)
-        tf.keras.preprocessing.image.save_img('target_image.png', target_image_array)
-        tf.keras.preprocessing.image.save_img('error_image.png', error_image_array)
-
-        input_image     = Image.open('input_image.png')
-        predicted_image = Image.open('predicted_image.png')
-        target_image    = Image.open('target_image.png')
-        error_image     = Image.open('error_image.png')
+        input_image     = self.array_to_image(input_image_array)
+        predicted_image = self.array_to_image(predicted_image_array)
+        target_image    = self.array_to_image(target_image_array)
+        error_image     = self.array_to_image(error_image_array)
 
         spacing        = 20
         label_height   = 20  
@@ -108,9 +144,4 @@ class ImageProcessor:
         final_image_path = os.path.join(save_path, filename)
         collage.save(final_image_path)
 
-        os.remove('input_image.png')
-        os.remove('predicted_image.png')
-        os.remove('target_image.png')
-        os.remove('error_image.png')
-
         return final_image_path
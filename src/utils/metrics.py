@@ -0,0 +1,231 @@
+import numpy as np
+import tensorflow as tf
+
+class RunningStats:
+    """
+    A class to compute the mean, variance, minimum and maximum of a stream of values in constant memory,
+    using Welford's algorithm extended to batches of values (Chan et al.). Non-finite values, such as the
+    infinite PSNR of a perfect prediction, are counted in skipped and left out of the statistics.
+    """
+
+    def __init__(self):
+        self.count   = 0
+        self.mean    = 0.0
+        self.m2      = 0.0
+        self.min     = np.inf
+        self.max     = -np.inf
+        self.skipped = 0
+
+    def update(self, values):
+        """
+        Add a batch of values to the statistics.
+
+        Parameters:
+        - values (numpy.ndarray): Values to add.
+        """
+        values        = np.asarray(values, dtype=np.float64).ravel()
+        finite        = np.isfinite(values)
+        self.skipped += values.size - np.count_nonzero(finite)
+        values        = values[finite]
+        if values.size == 0:
+            return
+
+        batch_count = values.size
+        batch_mean  = values.mean()
+        batch_m2    = np.sum(np.square(values - batch_mean))
+
+        total      = self.count + batch_count
+        delta      = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self.m2   += batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
+        self.min   = min(self.min, values.min())
+        self.max   = max(self.max, values.max())
+
+    @property
+    def variance(self):
+        """
+        Returns the sample variance of the values, or 0 for fewer than two values.
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        """
+        Returns the sample standard deviation of the values.
+        """
+        return np.sqrt(self.variance)
+
+class ReservoirSampler:
+    """
+    A class to keep a uniform random sample of bounded size from a stream of values (reservoir sampling),
+    from which quantiles of the stream are estimated. Quantiles are exact while the stream fits in the reservoir.
+    Non-finite values are left out of the stream, as in RunningStats.
+    """
+
+    def __init__(self, size=10000, seed=0):
+        """
+        Parameters:
+        - size (int, optional): Maximum number of values kept. Default is 10000.
+        - seed (int, optional): Seed of the random sampling. Default is 0.
+        """
+        self.size      = size
+        self.count     = 0
+        self.reservoir = np.empty(size, dtype=np.float64)
+        self.rng       = np.random.default_rng(seed)
+
+    def update(self, values):
+        """
+        Add a batch of values to the stream.
+
+        Parameters:
+        - values (numpy.ndarray): Values to add.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+
+        # Fill the reservoir first
+        fill = min(values.size, self.size - min(self.count, self.size))
+        self.reservoir[self.count:self.count + fill] = values[:fill]
+        self.count += fill
+        values      = values[fill:]
+        if values.size == 0:
+            return
+
+        # The value at position t of the stream replaces a random slot among t + 1, drawn for the whole batch at once
+        slots       = self.rng.integers(0, self.count + np.arange(values.size) + 1)
+        self.count += values.size
+        kept        = slots < self.size
+        slots       = slots[kept]
+        values      = values[kept]
+
+        # A later value replaces an earlier one drawn for the same slot, as in the sequential algorithm
+        last = slots.size - 1 - np.unique(slots[::-1], return_index=True)[1]
+        self.reservoir[slots[last]] = values[last]
+
+    def quantiles(self, q):
+        """
+        Estimate quantiles of the stream.
+
+        Parameters:
+        - q (list): Quantiles to estimate, between 0 and 1.
+
+        Returns:
+        - numpy.ndarray: The estimated quantiles, or NaNs if the stream is empty.
+        """
+        if self.count == 0:
+            return np.full(len(q), np.nan)
+        return np.quantile(self.reservoir[:min(self.count, self.size)], q)
+
+class EvaluationMetrics:
+    """
+    A class to compute image quality metrics between predictions and targets in batches, and to aggregate them
+    over a test set in constant memory.
+
+    The metrics of a batch are computed in a single traced TensorFlow function. For every metric, the mean,
+    standard deviation, minimum and maximum over the test set are computed with RunningStats, and the quartiles
+    are estimated with a ReservoirSampler. The metrics of each file are returned by update, so callers can stream
+    them to a per-file report without them being kept here.
+    """
+
+    # Names of the channels of the data cubes (see preprocessing/data_cube)
+    CHANNEL_NAMES = ("magnetogram", "divergence", "intensity")
+
+    # Range of the pixel values of the images, which are normalized to [-1, 1]
+    DATA_RANGE = 2.0
+
+    # Quantiles reported in the summary
+    QUANTILES = (0.25, 0.5, 0.75)
+
+    METRIC_NAMES = ("mse", "mae", "psnr", "ssim", "pearson") + tuple(
+        f"{error}_{channel}" for channel in CHANNEL_NAMES for error in ("mse", "mae")
+    )
+
+    def __init__(self, reservoir_size=10000):
+        """
+        Parameters:
+        - reservoir_size (int, optional): Number of values per metric kept to estimate the quartiles. Default is 10000.
+        """
+        self.stats    = {name: RunningStats() for name in self.METRIC_NAMES}
+        self.samplers = {name: ReservoirSampler(reservoir_size, seed) for seed, name in enumerate(self.METRIC_NAMES)}
+
+    @staticmethod
+    @tf.function
+    def compute(target, prediction):
+        """
+        Compute the metrics of each image of a batch.
+
+        Parameters:
+        - target (tensor): Target images, of shape (batch, height, width, channels).
+        - prediction (tensor): Predicted images, of the same shape.
+
+        Returns:
+        - dict: Tensors of shape (batch,) for each metric name in METRIC_NAMES.
+        """
+        target     = tf.cast(target, tf.float32)
+        prediction = tf.cast(prediction, tf.float32)
+        error      = target - prediction
+
+        # Per-channel errors, of shape (batch, channels)
+        channel_mse = tf.reduce_mean(tf.square(error), axis=[1, 2])
+        channel_mae = tf.reduce_mean(tf.abs(error), axis=[1, 2])
+
+        # Pearson correlation over all pixels and channels of each image
+        target_centered     = target - tf.reduce_mean(target, axis=[1, 2, 3], keepdims=True)
+        prediction_centered = prediction - tf.reduce_mean(prediction, axis=[1, 2, 3], keepdims=True)
+        covariance          = tf.reduce_sum(target_centered * prediction_centered, axis=[1, 2, 3])
+        norms               = tf.sqrt(tf.reduce_sum(tf.square(target_centered), axis=[1, 2, 3]) * tf.reduce_sum(tf.square(prediction_centered), axis=[1, 2, 3]))
+
+        metrics = {
+            "mse"     : tf.reduce_mean(channel_mse, axis=1),
+            "mae"     : tf.reduce_mean(channel_mae, axis=1),
+            "psnr"    : tf.image.psnr(target, prediction, max_val=EvaluationMetrics.DATA_RANGE),
+            "ssim"    : tf.image.ssim(target, prediction, max_val=EvaluationMetrics.DATA_RANGE),
+            "pearson" : tf.math.divide_no_nan(covariance, norms),
+        }
+        for idx, channel in enumerate(EvaluationMetrics.CHANNEL_NAMES):
+            metrics[f"mse_{channel}"] = channel_mse[:, idx]
+            metrics[f"mae_{channel}"] = channel_mae[:, idx]
+        return metrics
+
+    def update(self, target, prediction):
+        """
+        Compute the metrics of a batch and add them to the aggregates.
+
+        Parameters:
+        - target (tensor): Target images, of shape (batch, height, width, channels).
+        - prediction (tensor): Predicted images, of the same shape.
+
+        Returns:
+        - dict: Numpy arrays of shape (batch,) for each metric name in METRIC_NAMES.
+        """
+        metrics = {name: values.numpy() for name, values in self.compute(target, prediction).items()}
+        for name, values in metrics.items():
+            self.stats[name].update(values)
+            self.samplers[name].update(values)
+        return metrics
+
+    def summary(self):
+        """
+        Summarize each metric over all the files seen so far.
+
+        Returns:
+        - dict: For each metric name, a dictionary with the count, the number of non-finite values skipped, and
+                the mean, std, min, q25, median, q75 and max of the other values.
+        """
+        summary = {}
+        for name in self.METRIC_NAMES:
+            stats            = self.stats[name]
+            q25, median, q75 = self.samplers[name].quantiles(self.QUANTILES)
+            summary[name]    = {
+                "count"   : stats.count,
+                "skipped" : stats.skipped,
+                "mean"    : stats.mean,
+                "std"     : stats.std,
+                "min"     : stats.min,
+                "q25"     : q25,
+                "median"  : median,
+                "q75"     : q75,
+                "max"     : stats.max,
+            }
+        return summary
@@ -109,7 +109,38 @@ class PDFWriter:
         return image_path
 
 
-    def generate_pdf_report(checkpoint_path, timestamp, mse_values, final_save_path, images):
+    def add_metrics_table(pdf, metrics):
+        """
+        Add a table summarizing the evaluation metrics to the PDF.
+
+        Parameters:
+        - pdf (FPDF): The PDF document.
+        - metrics (EvaluationMetrics): Metrics computed during the evaluation.
+        """
+        summary = metrics.summary()
+        columns = ["mean", "std", "min", "median", "max"]
+
+        pdf.set_font("Arial", 'B', 14)
+        pdf.cell(190, 10, f"Metrics Summary ({summary['mse']['count']} files)", 0, 1, 'C')
+
+        name_col_width  = 0.25 * 190
+        value_col_width = 0.15 * 190
+        pdf.set_font("Arial", 'B', 10)
+        pdf.cell(name_col_width, 8, "Metric", 1)
+        for column in columns:
+            pdf.cell(value_col_width, 8, column.capitalize(), 1)
+        pdf.ln()
+
+        pdf.set_font("Arial", size=10)
+        for name, values in summary.items():
+            pdf.cell(name_col_width, 8, name, 1)
+            for column in columns:
+                pdf.cell(value_col_width, 8, f"{values[column]:.6f}", 1)
+            pdf.ln()
+        pdf.set_font("Arial", size=12)
+
+
+    def generate_pdf_report(checkpoint_path, timestamp, mse_values, final_save_path, images, metrics=None):
         """
         Generate a PDF report based on the given MSE values and images.
 
@@ -119,6 +150,8 @@ class PDFWriter:
         - mse_values (dict): Dictionary containing MSE values.
         - final_save_path (str): Path to save the final PDF report.
         - images (list): List of image paths to be included in the report.
+        - metrics (EvaluationMetrics, optional): Metrics computed during the evaluation. If provided, a table
+                                                 summarizing them is added to the report.
 
         Note:
         - The generated report will include a box and whisker plot, histogram, and a table of MSE values.
@@ -150,6 +183,11 @@ class PDFWriter:
         mse_histogram_path = PDFWriter.generate_histogram_plot(mse_values, final_save_path)
         pdf.image(mse_histogram_path, x = 10, y = pdf.get_y(), w = 190)  
 
+        # Add the summary of the evaluation metrics on a new page
+        if metrics is not None:
+            pdf.add_page()
+            PDFWriter.add_metrics_table(pdf, metrics)
+
         # Start table on a new page
         pdf.add_page()
         
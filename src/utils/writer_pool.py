@@ -0,0 +1,79 @@
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+class WriterPool:
+    """
+    A class to run output tasks, such as writing FITS files and rendering images, in a pool of threads,
+    so they overlap with the reading and inference of the next batches.
+
+    The number of pending tasks is bounded, so a producer faster than the writers blocks instead of
+    queueing an unbounded number of images in memory. The first error raised by a task is re-raised
+    by the next call to submit or by close.
+    """
+
+    def __init__(self, num_workers=4, max_pending=None):
+        """
+        Parameters:
+        - num_workers (int, optional): Number of writer threads. Default is 4.
+        - max_pending (int, optional): Maximum number of submitted tasks not yet completed. Default is 4 times the number of workers.
+        """
+        self.executor  = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="writer")
+        self.slots     = threading.BoundedSemaphore(max_pending or 4 * num_workers)
+        self.lock      = threading.Lock()
+        self.error     = None
+        self.tasks     = 0
+        self.busy_time = 0.0  # Time spent running tasks, summed over the threads
+        self.wait_time = 0.0  # Time the producer spent waiting for a free slot
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Submit a task, waiting for a free slot if the maximum number of pending tasks is reached.
+
+        Parameters:
+        - function (callable): Function to run.
+        - *args, **kwargs: Arguments of the function.
+        """
+        start = time.time()
+        self.slots.acquire()
+        self.wait_time += time.time() - start
+
+        if self.error is not None:
+            self.slots.release()
+            raise self.error
+        self.executor.submit(self._run, function, args, kwargs)
+
+    def _run(self, function, args, kwargs):
+        start = time.time()
+        try:
+            function(*args, **kwargs)
+        except Exception as e:
+            with self.lock:
+                if self.error is None:
+                    self.error = e
+        finally:
+            with self.lock:
+                self.tasks     += 1
+                self.busy_time += time.time() - start
+            self.slots.release()
+
+    def close(self):
+        """
+        Wait for all submitted tasks to complete.
+        """
+        start = time.time()
+        self.executor.shutdown(wait=True)
+        self.wait_time += time.time() - start
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.executor.shutdown(wait=True)
+        return False